@@ -0,0 +1,250 @@
+import tictac as tt
+from random import choice, randint, seed
+from sys import argv
+from time import perf_counter_ns
+
+
+def count_calls(names, counter):
+    """
+    Wraps tictac functions so every call (recursive ones included) is counted
+    Parameters:
+        names: Names of the tictac functions to wrap
+        counter: One item list incremented on each call
+    Returns: Dict with the original functions, to restore them later
+    """
+    originals = {name: getattr(tt, name) for name in names}
+
+    def wrap(func):
+        def counted(*args):
+            counter[0] += 1
+            return func(*args)
+
+        return counted
+
+    for name, func in originals.items():
+        setattr(tt, name, wrap(func))
+    return originals
+
+
+def random_openings(n_games, max_moves=2):
+    """
+    Parameters:
+        n_games: Number of openings to generate
+        max_moves: Maximum number of random moves played before the engines take over
+    Returns: List of (own, opponent) bitboards, own being the player to move
+    """
+    openings = []
+    for _ in range(n_games):
+        own, opponent = 0, 0
+        for _ in range(randint(0, max_moves)):
+            own, opponent = opponent, own | 1 << choice(
+                tt.AVAILABLE_TABLE[own | opponent]
+            )
+        openings.append((own, opponent))
+    return openings
+
+
+def self_play(best_move, openings, cold=False):
+    """
+    Plays one bot vs bot game from each opening with the same engine on both sides
+    Parameters:
+        best_move: Name of the tictac function (own, opponent) -> square
+        openings: List of (own, opponent) bitboards to start from
+        cold: Empties every cache before each game
+    Returns: List of per-move latencies (ns)
+    """
+    latencies = []
+    for own, opponent in openings:
+        if cold:
+            clear_tables()
+        while not tt.WON_TABLE[opponent] and own | opponent != tt.FULL_MASK:
+            start = perf_counter_ns()
+            square = getattr(tt, best_move)(own, opponent)
+            latencies.append(perf_counter_ns() - start)
+            own, opponent = opponent, own | 1 << square
+    return latencies
+
+
+def clear_tables():
+    """
+    Empties every cache shared between moves so each engine starts cold
+    """
+    tt.MOVE_CACHE.clear()
+    tt.MOVE_LOOKUP.clear()
+    tt.MINIMAX_CACHE.clear()
+    tt.MINIMAX_LOOKUP.clear()
+    tt.NEGAMAX_TABLE.clear()
+
+
+def measure(best_move, openings, counted=(), solve=None):
+    """
+    Times an engine, then replays the same games with counted nodes
+    Parameters:
+        best_move: Name of the tictac function (own, opponent) -> square
+        openings: List of (own, opponent) bitboards to start from
+        counted: Names of the tictac functions counted as search nodes
+        solve: Name of the tictac function filling the engine tables once before
+            the games, every game starts cold if None
+    Returns: Tuple with list of per-move latencies (ns), number of nodes and solve time (ns)
+    """
+    clear_tables()
+    solve_time = 0
+    if solve is not None:
+        start = perf_counter_ns()
+        getattr(tt, solve)()
+        solve_time = perf_counter_ns() - start
+    latencies = self_play(best_move, openings, cold=solve is None)
+
+    clear_tables()
+    if solve is not None:
+        getattr(tt, solve)()
+    counter = [0]
+    originals = count_calls(counted, counter)
+    try:
+        self_play(best_move, openings, cold=solve is None)
+    finally:
+        for name, func in originals.items():
+            setattr(tt, name, func)
+    return latencies, counter[0], solve_time
+
+
+def report(name, n_games, latencies, nodes, solve_time):
+    """
+    Prints one line of the benchmark table
+    Parameters:
+        name: Engine name
+        n_games: Number of games played
+        latencies: Per-move latencies (ns)
+        nodes: Number of search nodes visited
+        solve_time: Time spent filling the engine tables before the games (ns)
+    """
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    print(
+        f"{name:<20} {len(latencies):>6} {total / n_games / 1e3:>10.2f} "
+        f"{total / len(latencies) / 1e3:>10.2f} "
+        f"{latencies[int(0.95 * (len(latencies) - 1))] / 1e3:>10.2f} "
+        f"{nodes:>10} {nodes / total * 1e9 if total else 0:>12.0f} "
+        f"{solve_time / 1e6:>9.2f}"
+    )
+
+
+MAPPER = {1: True, -1: False, 0: None}
+
+
+def random_boards(n_boards):
+    """
+    Parameters:
+        n_boards: Number of boards to generate
+    Returns: Tuple with (N, 9) int8 array of boards reached by random play and
+        (N,) bool array, True if P1 is the player to move
+    """
+    from numpy import array, int8
+
+    boards, turns = [], []
+    while len(boards) < n_boards:
+        board, isP1 = [0] * 9, choice([True, False])
+        for _ in range(randint(0, 8)):
+            square = choice([i for i in range(9) if board[i] == 0])
+            board[square] = 1 if isP1 else -1
+            isP1 = not isP1
+            if tt.check_if_won(not isP1, [MAPPER[i] for i in board]) is not None:
+                break
+        boards.append(board)
+        turns.append(isP1)
+    return array(boards, dtype=int8), array(turns)
+
+
+def batch_benchmark(n_boards):
+    """
+    Compares the scalar functions against the batch API on the same boards
+    Parameters:
+        n_boards: Number of boards to evaluate
+    """
+    boards, turns = random_boards(n_boards)
+    lists = [[MAPPER[i] for i in board] for board in boards.tolist()]
+    tt.batch_move_table()
+
+    def scalar_best(board, isP1):
+        if tt.check_if_won(True, board) or tt.check_if_won(False, board) is False:
+            return -1
+        return tt.get_best_move(isP1, board) if None in board else -1
+
+    runs = [
+        (
+            "check_if_won",
+            lambda: [
+                (tt.check_if_won(True, b) is not None)
+                - (tt.check_if_won(False, b) is not None)
+                for b in lists
+            ],
+            lambda: tt.batch_check_if_won(boards),
+        ),
+        (
+            "get_available",
+            lambda: [tt.get_available(b) for b in lists],
+            lambda: tt.batch_get_available(boards),
+        ),
+        (
+            "get_best_move",
+            lambda: [scalar_best(b, t) for b, t in zip(lists, turns.tolist())],
+            lambda: tt.batch_get_best_move(turns, boards),
+        ),
+    ]
+    print(
+        f"{'function':<20} {'boards':>9} {'scalar ms':>10} {'batch ms':>10} {'speedup':>8}"
+    )
+    for name, scalar, batch in runs:
+        start = perf_counter_ns()
+        expected = scalar()
+        scalar_time = perf_counter_ns() - start
+        start = perf_counter_ns()
+        result = batch()
+        batch_time = perf_counter_ns() - start
+        if name != "get_available" and list(result) != expected:
+            raise Exception(f"Batch {name} does not match scalar results")
+        print(
+            f"{name:<20} {n_boards:>9} {scalar_time / 1e6:>10.2f} "
+            f"{batch_time / 1e6:>10.2f} {scalar_time / batch_time:>8.1f}"
+        )
+
+
+def main(argv):
+    n_games = int(argv[1]) if len(argv) > 1 else 10
+    seed(0)
+    openings = random_openings(n_games)
+    print(
+        f"{'engine':<20} {'moves':>6} {'us/game':>10} {'mean us':>10} "
+        f"{'p95 us':>10} {'nodes':>10} {'nodes/s':>12} {'solve ms':>9}"
+    )
+    report(
+        "heuristic",
+        n_games,
+        *measure(
+            "bitboard_best_move",
+            openings,
+            counted=["bitboard_move_points", "bitboard_hamming"],
+        ),
+    )
+    report(
+        "minimax (cold)",
+        n_games,
+        *measure("minimax_best_move", openings, counted=["negamax"]),
+    )
+    report(
+        "heuristic (solved)",
+        n_games,
+        *measure("cached_best_move", openings, solve="precompute_moves"),
+    )
+    report(
+        "minimax (solved)",
+        n_games,
+        *measure("cached_minimax_move", openings, solve="precompute_minimax"),
+    )
+    if len(argv) > 2:
+        print()
+        batch_benchmark(int(argv[2]))
+
+
+if __name__ == "__main__":
+    main(argv)
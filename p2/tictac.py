@@ -1,5 +1,7 @@
 from sys import maxsize as MAX_INTEGER
 from random import choice, random
+from json import load, dump
+from os import environ, path
 
 WINNING_BOARDS = [
     set([0, 1, 2]),
@@ -12,6 +14,46 @@ WINNING_BOARDS = [
     set([2, 4, 6]),
 ]
 
+WINNING_MASKS = [sum(1 << i for i in board) for board in WINNING_BOARDS]
+FULL_MASK = (1 << 9) - 1
+
+WON_TABLE = [
+    any(bits & mask == mask for mask in WINNING_MASKS) for bits in range(FULL_MASK + 1)
+]
+AVAILABLE_TABLE = [
+    [i for i in range(9) if not bits >> i & 1] for bits in range(FULL_MASK + 1)
+]
+
+SYMMETRIES = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8],
+    [2, 5, 8, 1, 4, 7, 0, 3, 6],
+    [8, 7, 6, 5, 4, 3, 2, 1, 0],
+    [6, 3, 0, 7, 4, 1, 8, 5, 2],
+    [2, 1, 0, 5, 4, 3, 8, 7, 6],
+    [6, 7, 8, 3, 4, 5, 0, 1, 2],
+    [0, 3, 6, 1, 4, 7, 2, 5, 8],
+    [8, 5, 2, 7, 4, 1, 6, 3, 0],
+]
+INVERSE_SYMMETRIES = [[symmetry.index(i) for i in range(9)] for symmetry in SYMMETRIES]
+SYMMETRY_TABLE = [
+    [sum(1 << symmetry[i] for i in range(9) if bits >> i & 1) for bits in range(1 << 9)]
+    for symmetry in SYMMETRIES
+]
+
+MOVE_CACHE = {}
+MOVE_LOOKUP = {}
+MINIMAX_CACHE = {}
+MINIMAX_LOOKUP = {}
+
+MOVE_ORDER = [4, 0, 2, 6, 8, 1, 3, 5, 7]
+ORDERED_AVAILABLE = [
+    [i for i in MOVE_ORDER if not bits >> i & 1] for bits in range(FULL_MASK + 1)
+]
+EXACT, LOWER, UPPER = 0, 1, 2
+BATCH_TABLES = {}
+NEGAMAX_TABLE = {}
+BOT_MODES = ["heuristic", "minimax"]
+
 get_available = lambda board: [idx for idx, i in enumerate(board) if i is None]
 
 get_available.__doc__ = """Parameters:
@@ -19,6 +61,25 @@ get_available.__doc__ = """Parameters:
 Returns: List of available squares
 """
 
+to_bitboard = lambda isP1, board: sum(
+    1 << idx for idx, i in enumerate(board) if i is isP1
+)
+
+to_bitboard.__doc__ = """Parameters:
+    isP1: True to get P1's squares, False to get P2's squares
+    board: TicTacToeGame board
+Returns: 9-bit integer with bit i set if square i belongs to the player
+"""
+
+occupied_bits = lambda board: sum(
+    1 << idx for idx, i in enumerate(board) if i is not None
+)
+
+occupied_bits.__doc__ = """Parameters:
+    board: TicTacToeGame board
+Returns: 9-bit integer with bit i set if square i is taken
+"""
+
 
 def replace_(list_, i, value):
     """
@@ -34,12 +95,7 @@ def replace_(list_, i, value):
 
 
 check_if_won = lambda isP1, board: (
-    isP1
-    if any(
-        i.issubset(set([idx for idx, i in enumerate(board) if i is isP1]))
-        for i in WINNING_BOARDS
-    )
-    else None
+    isP1 if WON_TABLE[to_bitboard(isP1, board)] else None
 )
 
 check_if_won.__doc__ = """Parameters:
@@ -48,18 +104,11 @@ check_if_won.__doc__ = """Parameters:
 Returns: True if won by P1, False if won by P2, if no one wins, None
 """
 
-check_if_double_win = lambda isP1, board: (
-    len(
-        [
-            True
-            for i in get_available(board)
-            if check_if_won(isP1, replace_(board, i, isP1)) is not None
-        ]
-    )
-    > 1
+check_if_double_win = lambda isP1, board: bitboard_double_win(
+    to_bitboard(isP1, board), occupied_bits(board)
 )
 
-check_if_won.__doc__ = """Parameters:
+check_if_double_win.__doc__ = """Parameters:
     isP1: True if P1's turn
     board: TicTacToeGame board to check if game had double win
 Returns: True if player will win for sure in their next turn
@@ -74,15 +123,36 @@ def hamming(isP1, board, depth=0):
         depth: Recursion depth
     Returns: Distance to winning state (1-3, 3 if game will tie)
     """
-    min_hamming = MAX_INTEGER
-    for square in get_available(board):
-        new_board = board.copy()
-        new_board[square] = isP1
-        if check_if_won(isP1, new_board) is not None:
-            min_hamming = min(min_hamming, 1)
-        if depth == 0 and hamming(isP1, new_board, depth=1) == 1:
-            min_hamming = min(min_hamming, 2)
-    return min(min_hamming, 3)
+    return bitboard_hamming(to_bitboard(isP1, board), occupied_bits(board), depth)
+
+
+bitboard_double_win = lambda own, occupied: (
+    sum(WON_TABLE[own | 1 << i] for i in AVAILABLE_TABLE[occupied]) > 1
+)
+
+bitboard_double_win.__doc__ = """Parameters:
+    own: Bitboard of the player to check
+    occupied: Bitboard of every taken square
+Returns: True if player will win for sure in their next turn
+"""
+
+
+def bitboard_hamming(own, occupied, depth=0):
+    """
+    Parameters:
+        own: Bitboard of the player to check distance to winning state
+        occupied: Bitboard of every taken square
+        depth: Recursion depth
+    Returns: Distance to winning state (1-3, 3 if game will tie)
+    """
+    min_hamming = 3
+    for square in AVAILABLE_TABLE[occupied]:
+        new_own = own | 1 << square
+        if WON_TABLE[new_own]:
+            return 1
+        if depth == 0 and bitboard_hamming(new_own, occupied | 1 << square, 1) == 1:
+            min_hamming = 2
+    return min_hamming
 
 
 STRING_MAPPER = {True: "X", False: "O", None: "*"}
@@ -106,9 +176,7 @@ def get_best_move(isP1, board):
         board: TicTacToeGame board to get best move from
     Returns: Best square that player can play
     """
-    available = get_available(board)
-    points = [calculate_move_points(isP1, board, square) for square in available]
-    return available[points.index(max(points))]
+    return cached_best_move(to_bitboard(isP1, board), to_bitboard(not isP1, board))
 
 
 def calculate_move_points(isP1, board, selected):
@@ -122,48 +190,395 @@ def calculate_move_points(isP1, board, selected):
     if board[selected] is not None:
         raise Exception("Selected invalid square")
 
-    def is_blocking(isP1, board, selected):
-        new_board = board.copy()
-        new_board[selected] = not isP1
+    return bitboard_move_points(
+        to_bitboard(isP1, board), to_bitboard(not isP1, board), selected
+    )
+
+
+def bitboard_best_move(own, opponent):
+    """
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+    Returns: Best square that player can play
+    """
+    available = AVAILABLE_TABLE[own | opponent]
+    points = [bitboard_move_points(own, opponent, square) for square in available]
+    return available[points.index(max(points))]
+
 
-        return check_if_won(not isP1, new_board) is not None
+def bitboard_move_points(own, opponent, selected):
+    """
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+        selected: Selected square to calculate move points from
+    Returns: Points given by selected square
+    """
+    square = 1 << selected
+    if (own | opponent) & square:
+        raise Exception("Selected invalid square")
 
-    new_board = board.copy()
-    new_board[selected] = isP1
-    if check_if_won(isP1, new_board) is not None:
+    occupied = own | opponent | square
+    new_own = own | square
+    if WON_TABLE[new_own]:
         return MAX_INTEGER
-    if check_if_double_win(isP1, new_board):
+    if bitboard_double_win(new_own, occupied):
         return 20
-    if is_blocking(isP1, board, selected):
+    if WON_TABLE[opponent | square]:
         return 10
-    if hamming(not isP1, new_board) == 1:
+    if bitboard_hamming(opponent, occupied) == 1:
         return -MAX_INTEGER
-    return 4 - hamming(isP1, new_board)
+    return 4 - bitboard_hamming(new_own, occupied)
+
+
+def canonical_key(own, opponent):
+    """
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+    Returns: Tuple with the smallest key (own | opponent << 9) among the 8
+        rotations/reflections of the board and the index of that symmetry
+    """
+    return min(
+        (table[own] | table[opponent] << 9, idx)
+        for idx, table in enumerate(SYMMETRY_TABLE)
+    )
+
+
+def memoized_move(own, opponent, cache, lookup, best_move):
+    """
+    Looks a move up in a symmetry-reduced cache, computing it on a miss
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+        cache: Dict {canonical key: move on the canonical board}
+        lookup: Dict {own | opponent << 9: move}, filled as boards are seen
+        best_move: Function (own, opponent) -> square, run on canonical boards
+    Returns: Best square that player can play
+    """
+    raw_key = own | opponent << 9
+    move = lookup.get(raw_key)
+    if move is not None:
+        return move
+
+    key, symmetry = canonical_key(own, opponent)
+    canonical_move = cache.get(key)
+    if canonical_move is None:
+        canonical_move = best_move(key & FULL_MASK, key >> 9)
+        cache[key] = canonical_move
+    move = lookup[raw_key] = INVERSE_SYMMETRIES[symmetry][canonical_move]
+    return move
+
+
+def cached_best_move(own, opponent):
+    """
+    Memoized bitboard_best_move, shared across symmetric boards
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+    Returns: Best square that player can play
+    """
+    return memoized_move(own, opponent, MOVE_CACHE, MOVE_LOOKUP, bitboard_best_move)
+
+
+def precompute_moves(cache=MOVE_CACHE, best_move=bitboard_best_move):
+    """
+    Fills a move cache with the best move of every reachable position
+    Parameters:
+        cache: Dict {canonical key: move on the canonical board}
+        best_move: Function (own, opponent) -> square
+    Returns: Number of canonical positions in cache
+    """
+    stack = [(0, 0)]
+    seen = set()
+    while stack:
+        own, opponent = stack.pop()
+        key = canonical_key(own, opponent)[0]
+        if key in seen:
+            continue
+        seen.add(key)
+        if WON_TABLE[opponent] or own | opponent == FULL_MASK:
+            continue
+        if key not in cache:
+            cache[key] = best_move(key & FULL_MASK, key >> 9)
+        stack.extend(
+            (opponent, own | 1 << square) for square in AVAILABLE_TABLE[own | opponent]
+        )
+    return len(cache)
+
+
+save_moves = lambda file: dump(MOVE_CACHE, open(file, "w"))
+save_moves.__doc__ = """Dumps MOVE_CACHE to json file
+Parameters:
+    file: File directory to dump json to
+"""
+
+
+def load_moves(file):
+    """
+    Loads MOVE_CACHE from a json file written by save_moves
+    Parameters:
+        file: Json file with the move table
+    Returns: Number of canonical positions in MOVE_CACHE
+    """
+    MOVE_CACHE.update({int(key): move for key, move in load(open(file, "r")).items()})
+    MOVE_LOOKUP.clear()
+    return len(MOVE_CACHE)
+
+
+def negamax(own, opponent, alpha=-10, beta=10):
+    """
+    Alpha-beta negamax over bitboards, sharing NEGAMAX_TABLE between calls,
+    symmetric boards share one entry
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+        alpha: Lower bound of the search window
+        beta: Upper bound of the search window
+    Returns: Score for the player to move (empty squares + 1 if they win, negative if they lose, 0 if tie)
+    """
+    occupied = own | opponent
+    available = ORDERED_AVAILABLE[occupied]
+    if WON_TABLE[opponent]:
+        return -len(available) - 1
+    if not available:
+        return 0
+
+    key = min(table[own] | table[opponent] << 9 for table in SYMMETRY_TABLE)
+    original_alpha = alpha
+    entry = NEGAMAX_TABLE.get(key)
+    if entry is not None:
+        value, bound = entry
+        if bound == EXACT:
+            return value
+        if bound == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    if any(WON_TABLE[own | 1 << square] for square in available):
+        NEGAMAX_TABLE[key] = (len(available), EXACT)
+        return len(available)
+
+    blocking = [square for square in available if WON_TABLE[opponent | 1 << square]]
+    best = -10
+    for square in blocking or available:
+        value = -negamax(opponent, own | 1 << square, -beta, -alpha)
+        if value > best:
+            best = value
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+    NEGAMAX_TABLE[key] = (
+        best,
+        UPPER if best <= original_alpha else (LOWER if best >= beta else EXACT),
+    )
+    return best
+
+
+def minimax_best_move(own, opponent):
+    """
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+    Returns: Square with the best exact negamax score
+    """
+    best, best_square = -10, None
+    for square in ORDERED_AVAILABLE[own | opponent]:
+        value = -negamax(opponent, own | 1 << square, -10, -best)
+        if value > best:
+            best, best_square = value, square
+    return best_square
+
+
+def cached_minimax_move(own, opponent):
+    """
+    Memoized minimax_best_move, shared across symmetric boards
+    Parameters:
+        own: Bitboard of the player to move
+        opponent: Bitboard of the other player
+    Returns: Square with the best exact negamax score
+    """
+    return memoized_move(
+        own, opponent, MINIMAX_CACHE, MINIMAX_LOOKUP, minimax_best_move
+    )
+
+
+precompute_minimax = lambda: precompute_moves(MINIMAX_CACHE, minimax_best_move)
+precompute_minimax.__doc__ = """Solves every reachable position once into MINIMAX_CACHE
+Returns: Number of canonical positions in MINIMAX_CACHE
+"""
+
+
+def batch_to_bitboards(boards):
+    """
+    Parameters:
+        boards: (N, 9) int8 array of boards (1 for P1, -1 for P2, 0 for empty)
+    Returns: Tuple with (N,) arrays of P1 and P2 bitboards
+    """
+    from numpy import arange, asarray, int64
+
+    boards = asarray(boards)
+    weights = 1 << arange(9, dtype=int64)
+    return (boards == 1) @ weights, (boards == -1) @ weights
+
+
+def batch_check_if_won(boards):
+    """
+    Parameters:
+        boards: (N, 9) int8 array of boards (1 for P1, -1 for P2, 0 for empty)
+    Returns: (N,) int8 array with 1 if won by P1, -1 if won by P2, 0 if no one wins
+    """
+    from numpy import array, int8
+
+    masks = array(WINNING_MASKS)
+    p1, p2 = batch_to_bitboards(boards)
+    won = lambda bits: (bits[:, None] & masks == masks).any(axis=1)
+    return won(p1).astype(int8) - won(p2).astype(int8)
+
+
+def batch_get_available(boards):
+    """
+    Parameters:
+        boards: (N, 9) int8 array of boards (1 for P1, -1 for P2, 0 for empty)
+    Returns: (N, 9) bool array, True for available squares
+    """
+    from numpy import asarray
+
+    return asarray(boards) == 0
+
+
+def batch_move_table():
+    """
+    Builds (once) a dense table with the cached best move of every reachable position
+    Returns: (512 * 512,) int8 array indexed by own | opponent << 9, -1 for unknown positions
+    """
+    if "moves" not in BATCH_TABLES:
+        from numpy import full, int8
+
+        table = full(1 << 18, -1, dtype=int8)
+        stack = [(0, 0)]
+        while stack:
+            own, opponent = stack.pop()
+            key = own | opponent << 9
+            if table[key] != -1 or WON_TABLE[opponent] or own | opponent == FULL_MASK:
+                continue
+            table[key] = cached_best_move(own, opponent)
+            stack.extend(
+                (opponent, own | 1 << square)
+                for square in AVAILABLE_TABLE[own | opponent]
+            )
+        BATCH_TABLES["moves"] = table
+    return BATCH_TABLES["moves"]
+
+
+def batch_get_best_move(isP1, boards):
+    """
+    Parameters:
+        isP1: True if P1's turn (bool or (N,) bool array)
+        boards: (N, 9) int8 array of boards (1 for P1, -1 for P2, 0 for empty)
+    Returns: (N,) int8 array with the best square for each board, -1 if the game has ended
+    """
+    from numpy import flatnonzero, where
+
+    p1, p2 = batch_to_bitboards(boards)
+    own, opponent = where(isP1, p1, p2), where(isP1, p2, p1)
+    moves = batch_move_table()[own | opponent << 9]
+    for idx in flatnonzero(moves == -1):
+        if not (
+            WON_TABLE[own[idx]]
+            or WON_TABLE[opponent[idx]]
+            or own[idx] | opponent[idx] == FULL_MASK
+        ):
+            moves[idx] = cached_best_move(int(own[idx]), int(opponent[idx]))
+    return moves
+
+
+class History:
+    def __init__(self):
+        """
+        Compact TicTacToeGame history, one byte per move (square | player << 4)
+        Boards and board strings are rendered on demand
+        Returns: History object
+        """
+        self.moves = bytearray()
+
+    def append(self, square, isP1):
+        """
+        Parameters:
+            square: Square played
+            isP1: True if P1 played the square
+        """
+        self.moves.append(square | isP1 << 4)
+
+    def boards(self):
+        """
+        Returns: Iterator over the TicTacToeGame board after each move, starting with the empty board
+        """
+        board = [None] * 9
+        yield board.copy()
+        for move in self.moves:
+            board[move & 15] = bool(move >> 4)
+            yield board.copy()
+
+    def board(self, idx):
+        """
+        Parameters:
+            idx: Number of moves to replay (negative values count from the end)
+        Returns: TicTacToeGame board after idx moves
+        """
+        idx = range(len(self))[idx]
+        board = [None] * 9
+        for move in self.moves[:idx]:
+            board[move & 15] = bool(move >> 4)
+        return board
+
+    __len__ = lambda self: len(self.moves) + 1
+    __len__.__doc__ = """Returns: Number of boards in history (moves + empty board)"""
+
+    __iter__ = lambda self: map(board_string, self.boards())
+    __iter__.__doc__ = """Returns: Iterator over the board strings after each move"""
+
+    def __getitem__(self, idx):
+        """
+        Parameters:
+            idx: Index or slice of boards in history
+        Returns: Board string (or list of board strings) after idx moves
+        """
+        if isinstance(idx, slice):
+            return [board_string(self.board(i)) for i in range(len(self))[idx]]
+        return board_string(self.board(idx))
 
 
 class TicTacToeGame:
-    def __init__(self, multiplayer=True, bot_level=1.0):
+    def __init__(self, multiplayer=True, bot_level=1.0, bot_mode="heuristic"):
         """
         TicTacToe Game
         Parameters:
             multiplayer(True): If game mode is multiplayer
             bot_level(1.0): Level of the bot to play in single player mode (.0 to 1.)
+            bot_mode("heuristic"): Engine used by the bot ("heuristic" or "minimax")
         Returns: TicTacToeGame object
         """
+        if bot_mode not in BOT_MODES:
+            raise Exception("Invalid bot mode")
+
         self.board = [None] * 9
         self.isP1 = choice([True, False])
         self.winner = None
         self.ended = False
         self.multiplayer = multiplayer
-        self.history = [board_string(self.board)]
+        self.bitboard = [0, 0]
+        self.history = History()
         self.bot_level = bot_level
+        self.bot_mode = bot_mode
 
         if not self.isP1 and not self.multiplayer:
-            self.choose_square(
-                get_best_move(False, self.board)
-                if random() < bot_level
-                else choice(get_available(self.board))
-            )
+            self.choose_square(self.bot_square())
 
     def play_round(self, square):
         """
@@ -174,15 +589,24 @@ class TicTacToeGame:
         """
         if not self.ended:
             self.choose_square(square)
-            if not self.multiplayer and None in self.board:
-                self.choose_square(
-                    get_best_move(False, self.board)
-                    if random() < self.bot_level
-                    else choice(get_available(self.board))
-                )
+            if not self.multiplayer and self.occupied() != FULL_MASK:
+                self.choose_square(self.bot_square())
             return True
         return False
 
+    occupied = lambda self: self.bitboard[False] | self.bitboard[True]
+    occupied.__doc__ = """Returns: Bitboard of every taken square"""
+
+    def bot_square(self):
+        """
+        Returns: Square chosen by the bot (P2) according to bot_level
+        """
+        if random() < self.bot_level:
+            return (
+                cached_minimax_move if self.bot_mode == "minimax" else cached_best_move
+            )(self.bitboard[False], self.bitboard[True])
+        return choice(AVAILABLE_TABLE[self.occupied()])
+
     def choose_square(self, square):
         """
         Parameters:
@@ -192,16 +616,29 @@ class TicTacToeGame:
             raise Exception("Selected invalid square")
 
         self.board[square] = self.isP1
-        self.history.append(board_string(self.board))
+        self.bitboard[self.isP1] |= 1 << square
+        self.history.append(square, self.isP1)
 
-        if check_if_won(self.isP1, self.board) is not None:
+        if WON_TABLE[self.bitboard[self.isP1]]:
             self.winner = self.isP1
             self.ended = True
             return
 
-        if None not in self.board:
+        if self.occupied() == FULL_MASK:
             self.winner = None
             self.ended = True
             return
 
         self.isP1 = not self.isP1
+
+
+match environ.get("TICTAC_MOVES"):
+    case None:
+        pass
+    case "precompute":
+        precompute_moves()
+    case file if path.isfile(file):
+        load_moves(file)
+    case file:
+        precompute_moves()
+        save_moves(file)
@@ -0,0 +1,144 @@
+import tictac as tt
+from csv import writer
+from multiprocessing import Pool
+from random import choice, random, seed as set_seed
+from sys import argv
+from time import perf_counter_ns
+
+CSV_HEADER = [
+    "bot_level",
+    "opponent_level",
+    "bot_mode",
+    "games",
+    "wins",
+    "draws",
+    "losses",
+    "moves",
+    "move_time_ns",
+    "max_move_time_ns",
+]
+
+
+def warm_up():
+    """
+    Pool initializer, solves the heuristic and minimax move tables once per worker
+    """
+    tt.precompute_moves()
+    tt.precompute_minimax()
+
+
+def opponent_square(game, opponent_level):
+    """
+    Parameters:
+        game: TicTacToeGame where it is P1's turn
+        opponent_level: Level of the P1 bot (.0 to 1.)
+    Returns: Square chosen for P1
+    """
+    if random() < opponent_level:
+        return tt.cached_best_move(game.bitboard[True], game.bitboard[False])
+    return choice(tt.AVAILABLE_TABLE[game.occupied()])
+
+
+def play_games(task):
+    """
+    Plays a chunk of single player games, P1 being a bot with opponent_level
+    Parameters:
+        task: Tuple (config index, bot_level, opponent_level, bot_mode, n_games, seed)
+    Returns: Tuple (config index, games, wins, draws, losses, moves, move_time_ns, max_move_time_ns),
+        counted from the point of view of the P2 bot
+    """
+    idx, bot_level, opponent_level, bot_mode, n_games, seed = task
+    set_seed(seed)
+    wins = draws = losses = moves = move_time = max_move_time = 0
+    for _ in range(n_games):
+        game = tt.TicTacToeGame(
+            multiplayer=False, bot_level=bot_level, bot_mode=bot_mode
+        )
+        while not game.ended:
+            square = opponent_square(game, opponent_level)
+            start = perf_counter_ns()
+            game.play_round(square)
+            elapsed = perf_counter_ns() - start
+            moves += 1
+            move_time += elapsed
+            max_move_time = max(max_move_time, elapsed)
+
+        match game.winner:
+            case False:
+                wins += 1
+            case True:
+                losses += 1
+            case _:
+                draws += 1
+    return idx, n_games, wins, draws, losses, moves, move_time, max_move_time
+
+
+def run_tournament(configs, n_games, file=None, processes=None, chunk_size=100, seed=0):
+    """
+    Plays n_games per configuration across a process pool
+    Parameters:
+        configs: List of tuples (bot_level, opponent_level, bot_mode)
+        n_games: Number of games per configuration
+        file: Csv file to stream one row per finished chunk to
+        processes: Number of worker processes (None for cpu count)
+        chunk_size: Number of games played by a worker per task
+        seed: Base seed, each task uses seed + task index
+    Returns: List with the summed results for each configuration,
+        in the same order as CSV_HEADER
+    """
+    tasks = []
+    for idx, (bot_level, opponent_level, bot_mode) in enumerate(configs):
+        for start in range(0, n_games, chunk_size):
+            tasks.append(
+                (
+                    idx,
+                    bot_level,
+                    opponent_level,
+                    bot_mode,
+                    min(chunk_size, n_games - start),
+                    seed + len(tasks),
+                )
+            )
+
+    totals = [list(config) + [0] * 7 for config in configs]
+    csv_file = open(file, "w", newline="") if file is not None else None
+    csv_writer = writer(csv_file) if csv_file is not None else None
+    if csv_writer is not None:
+        csv_writer.writerow(CSV_HEADER)
+
+    try:
+        with Pool(processes, initializer=warm_up) as pool:
+            for idx, *result in pool.imap_unordered(play_games, tasks):
+                total = totals[idx]
+                total[3:9] = [a + b for a, b in zip(total[3:9], result[:6])]
+                total[9] = max(total[9], result[6])
+                if csv_writer is not None:
+                    csv_writer.writerow(list(configs[idx]) + result)
+                    csv_file.flush()
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+    return totals
+
+
+def main(argv):
+    if len(argv) < 2:
+        raise Exception("Enter number of games per configuration")
+    levels = [0.0, 0.25, 0.5, 0.75, 1.0]
+    configs = [(level, 1.0, mode) for mode in tt.BOT_MODES for level in levels]
+    totals = run_tournament(
+        configs, int(argv[1]), file=argv[2] if len(argv) > 2 else None
+    )
+    print(
+        f"{'bot_level':>9} {'opponent':>9} {'mode':>10} "
+        f"{'wins':>7} {'draws':>7} {'losses':>7} {'us/move':>8}"
+    )
+    for level, opponent, mode, games, wins, draws, losses, moves, time, _ in totals:
+        print(
+            f"{level:>9} {opponent:>9} {mode:>10} "
+            f"{wins:>7} {draws:>7} {losses:>7} {time / moves / 1e3:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main(argv)
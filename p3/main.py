@@ -1,8 +1,20 @@
-from threading import Thread
+from threading import Thread, BoundedSemaphore
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from array import array
+from atexit import register
+from mmap import mmap, ACCESS_READ
+from itertools import islice
+from os import PathLike, path
 from math import ceil
 from random import randint
 from sys import argv
-from time import time, sleep
+from time import time, sleep, perf_counter_ns
+from csv import writer
+
+BACKENDS = ["thread", "process", "numpy"]
+CHUNK_SIZE = 1 << 20
+pools = {}
 
 get_duration = lambda start_time: time() - start_time
 
@@ -11,6 +23,17 @@ get_duration.__doc__ = """Parameters:
 Returns: Time duration between when function is called and start_time
 """
 
+def split_ranges(length, n):
+    """
+    Parameters:
+        length: Length of the sequence to split
+        n: N° of parts to split sequence into
+    Returns: List of (start, stop) index pairs
+    """
+    k, m = divmod(length, n)
+    return [(i * k + min(i, m), (i + 1) * k + min(i + 1, m)) for i in range(n)]
+
+
 def split_list(list_, n):
     """
     Parameters:
@@ -18,29 +41,182 @@ def split_list(list_, n):
         n: N° of parts to split list into
     Returns: List of slices
     """
-    k, m = divmod(len(list_), n)
-    return [list_[i * k + min(i, m) : (i + 1) * k + min(i + 1, m)] for i in range(n)]
+    return [list_[start:stop] for start, stop in split_ranges(len(list_), n)]
+
+
+def split_views(list_, n):
+    """
+    Splits list_ into n parts without copying any item
+    Parameters:
+        list_: list, tuple, array.array, bytes-like object or NumPy array
+        n: N° of parts to split list into
+    Returns: List of views (lazy iterators for lists/tuples, NumPy slices for
+        NumPy arrays, memoryview slices for any other buffer)
+    """
+    ranges = split_ranges(len(list_), n)
+    if isinstance(list_, (list, tuple)):
+        return [islice(list_, start, stop) for start, stop in ranges]
+    if hasattr(list_, "__array_interface__"):
+        return [list_[start:stop] for start, stop in ranges]
+    view = memoryview(list_)
+    return [view[start:stop] for start, stop in ranges]
+
+
+def as_numpy(list_):
+    """
+    Parameters:
+        list_: list, tuple, array.array, bytes-like object or NumPy array
+    Returns: NumPy array of the items, sharing memory with list_ unless it is a list/tuple
+    """
+    from numpy import asarray, frombuffer, int64
+
+    if isinstance(list_, (list, tuple)):
+        return asarray(list_, dtype=int64)
+    if hasattr(list_, "__array_interface__"):
+        return asarray(list_)
+    return frombuffer(list_, dtype=memoryview(list_).format)
 
 
 def thread_func(i, list_, buf):
     """
     Parameters:
         i: index on buf
-        list_: list_ with items to sum
+        list_: list_ with items to sum (NumPy arrays are reduced with their own sum)
         buf: buffer to write result in
     """
-    buf[i] = sum(list_)
+    buf[i] = int(list_.sum()) if hasattr(list_, "__array_interface__") else sum(list_)
+
+
+def get_pool(n_processes):
+    """
+    Parameters:
+        n_processes: Number of worker processes
+    Returns: Persistent process pool with n_processes workers, created on first use
+    """
+    if n_processes not in pools:
+        pools[n_processes] = Pool(n_processes)
+    return pools[n_processes]
+
+
+@register
+def close_pools():
+    """
+    Terminates every pool created by get_pool
+    """
+    for pool in pools.values():
+        pool.terminate()
+    pools.clear()
+
+
+def shared_sum(name, start, stop, typecode):
+    """
+    Parameters:
+        name: Name of the shared memory block holding the items
+        start: Index of the first item to sum
+        stop: Index after the last item to sum
+        typecode: array typecode of the items
+    Returns: Sum of items in [start, stop)
+    """
+    shm = SharedMemory(name=name)
+    view = shm.buf.cast(typecode)
+    part = view[start:stop]
+    collector = sum(part)
+    part.release()
+    view.release()
+    shm.close()
+    return collector
+
+
+def sum_multithread_n_threads(list_, n_threads=2, backend="thread"):
+    """
+    Parameters:
+        list_: list_ with items to sum
+        n_threads: n_threads to execute sum (processes for the process backend)
+        backend: "thread", "process" (shared memory + persistent pool) or "numpy"
+    Returns: Sum of items in list
+    """
+    match backend:
+        case "thread":
+            return sum_threads(list_, n_threads)
+        case "process":
+            return sum_processes(list_, n_threads)
+        case "numpy":
+            return sum_numpy(list_, n_threads)
+        case _:
+            raise Exception("Invalid backend")
+
+
+def sum_threads(list_, n_threads=2):
+    """
+    Parameters:
+        list_: list_ with items to sum
+        n_threads: n_threads to execute sum
+    Returns: Sum of items in list
+    """
+    buf = [None] * n_threads
+    slices = split_views(list_, n_threads)
+    threads = [
+        Thread(
+            target=thread_func,
+            args=(i, slices[i], buf),
+        )
+        for i in range(n_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(buf)
+
+
+def sum_processes(list_, n_processes=2):
+    """
+    Copies the items once to shared memory and sums zero-copy slices in a persistent pool
+    Parameters:
+        list_: list, tuple, array.array, bytes-like object or NumPy array with items to sum
+        n_processes: Number of worker processes
+    Returns: Sum of items in list
+    """
+    if len(list_) == 0:
+        return 0
+    is_sequence = isinstance(list_, (list, tuple))
+    typecode = "q" if is_sequence else memoryview(list_).format
+    itemsize = array(typecode).itemsize
+    shm = SharedMemory(create=True, size=len(list_) * itemsize)
+    try:
+        if is_sequence:
+            view = shm.buf.cast(typecode)
+            for start in range(0, len(list_), CHUNK_SIZE):
+                view[start : start + CHUNK_SIZE] = array(
+                    typecode, list_[start : start + CHUNK_SIZE]
+                )
+            view.release()
+        else:
+            shm.buf[: len(list_) * itemsize] = memoryview(list_).cast("B")
+        return sum(
+            get_pool(n_processes).starmap(
+                shared_sum,
+                [
+                    (shm.name, start, stop, typecode)
+                    for start, stop in split_ranges(len(list_), n_processes)
+                ],
+            )
+        )
+    finally:
+        shm.close()
+        shm.unlink()
 
 
-def sum_multithread_n_threads(list_, n_threads=2):
+def sum_numpy(list_, n_threads=2):
     """
+    Sums NumPy views of the items in n_threads (NumPy releases the GIL while reducing)
     Parameters:
         list_: list_ with items to sum
         n_threads: n_threads to execute sum
     Returns: Sum of items in list
     """
     buf = [None] * n_threads
-    slices = split_list(list_, n_threads)
+    slices = split_views(as_numpy(list_), n_threads)
     threads = [
         Thread(
             target=thread_func,
@@ -55,6 +231,92 @@ def sum_multithread_n_threads(list_, n_threads=2):
     return sum(buf)
 
 
+def mmap_sum(file, start, stop, typecode):
+    """
+    Parameters:
+        file: Binary file of packed items
+        start: Index of the first item to sum
+        stop: Index after the last item to sum
+        typecode: array typecode of the items
+    Returns: Sum of items in [start, stop)
+    """
+    itemsize = array(typecode).itemsize
+    with open(file, "rb") as file_, mmap(file_.fileno(), 0, access=ACCESS_READ) as map_:
+        view = memoryview(map_)[start * itemsize : stop * itemsize]
+        items = view.cast(typecode)
+        collector = sum(items)
+        items.release()
+        view.release()
+    return collector
+
+
+def mmap_sum_task(task):
+    """
+    Parameters:
+        task: Tuple of mmap_sum arguments
+    Returns: mmap_sum of task
+    """
+    return mmap_sum(*task)
+
+
+def sum_stream(source, chunk_size=CHUNK_SIZE, n_processes=2, typecode="q"):
+    """
+    Sums a binary file (through mmap) or any iterator in chunks spread over a persistent pool,
+    keeping at most 2 * n_processes chunks in flight
+    Parameters:
+        source: Path (str or path-like) of a binary file of packed items, or iterable of integers
+        chunk_size: Number of items per chunk
+        n_processes: Number of worker processes
+        typecode: array typecode of the items
+    Returns: Tuple with sum of items, number of items and items per second
+    """
+    is_path = isinstance(source, (str, PathLike))
+    if is_path and not path.isfile(source):
+        raise FileNotFoundError(f"{source} is not a file")
+
+    pool = get_pool(n_processes)
+    start_time = perf_counter_ns()
+    partials = []
+    errors = []
+
+    if is_path:
+        n_items = path.getsize(source) // array(typecode).itemsize
+        total = sum(
+            pool.imap_unordered(
+                mmap_sum_task,
+                [
+                    (source, start, min(start + chunk_size, n_items), typecode)
+                    for start in range(0, n_items, chunk_size)
+                ],
+            )
+        )
+    else:
+        n_items = 0
+        pending = BoundedSemaphore(2 * n_processes)
+
+        def on_done(result):
+            partials.append(result)
+            pending.release()
+
+        def on_error(error):
+            errors.append(error)
+            pending.release()
+
+        iterator = iter(source)
+        while not errors and (chunk := array(typecode, islice(iterator, chunk_size))):
+            pending.acquire()
+            n_items += len(chunk)
+            pool.apply_async(sum, (chunk,), callback=on_done, error_callback=on_error)
+        for _ in range(2 * n_processes):
+            pending.acquire()
+        if errors:
+            raise errors[0]
+        total = sum(partials)
+
+    elapsed = (perf_counter_ns() - start_time) / 1e9
+    return total, n_items, n_items / elapsed if elapsed else 0
+
+
 def sum_multithread_2_threads(list_):
     """
     Parameters:
@@ -62,14 +324,15 @@ def sum_multithread_2_threads(list_):
     Returns: Sum of items in list
     """
     buf = [0] * 2
+    slices = split_views(list_, 2)
     threads = [
         Thread(
             target=thread_func,
-            args=(0, list_[: len(list_) // 2], buf),
+            args=(0, slices[0], buf),
         ),
         Thread(
             target=thread_func,
-            args=(1, list_[len(list_) // 2 :], buf),
+            args=(1, slices[1], buf),
         ),
     ]
     for thread in threads:
@@ -86,7 +349,7 @@ def sum_singlethread(list_):
     Returns: Sum of items in list
     """
     collector = 0
-    for i in list_:
+    for i in memoryview(list_) if hasattr(list_, "__array_interface__") else list_:
         collector += i
     return collector
 
@@ -117,11 +380,129 @@ def sum_singlethread(list_):
 #         sleep_()
 
 
+def percentile(sorted_values, q):
+    """
+    Parameters:
+        sorted_values: Sorted list of values
+        q: Percentile (0 to 100)
+    Returns: Nearest-rank percentile of values
+    """
+    return sorted_values[max(ceil(q / 100 * len(sorted_values)) - 1, 0)]
+
+
+def get_strategies(thread_counts):
+    """
+    Parameters:
+        thread_counts: Thread counts to benchmark sum_multithread_n_threads with
+    Returns: List of (label, function) pairs, sum_singlethread first
+    """
+    strategies = [
+        ("Singlethread", sum_singlethread),
+        ("Two threads", sum_multithread_2_threads),
+    ]
+    for backend in BACKENDS:
+        for n in thread_counts:
+            strategies.append(
+                (
+                    f"{backend.capitalize()} ({n})",
+                    lambda list_, n=n, backend=backend: sum_multithread_n_threads(
+                        list_, n, backend
+                    ),
+                )
+            )
+    return strategies
+
+
+def benchmark(sizes, thread_counts, repeats=5, warmup=1, file=None):
+    """
+    Times every summation strategy for each list size
+    Parameters:
+        sizes: List sizes to sweep
+        thread_counts: Thread counts to sweep
+        repeats: Timed runs per strategy and size
+        warmup: Untimed runs per strategy and size
+        file: Csv file to write median times (ms) to, in the p9/benchmark.csv layout,
+            p95 times go to the same name with a _p95 suffix
+    Returns: Dict {label: [(median_ns, p95_ns) for each size]}
+    """
+    strategies = get_strategies(thread_counts)
+    results = {label: [] for label, _ in strategies}
+    for size in sizes:
+        list_ = [randint(1, 100) for _ in range(size)]
+        expected = sum(list_)
+        for label, func in strategies:
+            for _ in range(warmup):
+                func(list_)
+            durations = []
+            for _ in range(repeats):
+                start = perf_counter_ns()
+                result = func(list_)
+                durations.append(perf_counter_ns() - start)
+                if result != expected:
+                    raise Exception(f"{label} returned a wrong sum")
+            durations.sort()
+            results[label].append(
+                (percentile(durations, 50), percentile(durations, 95))
+            )
+
+    print(
+        f"{'strategy':<16} {'size':>10} {'median ms':>10} {'p95 ms':>10} {'speedup':>8}"
+    )
+    for label, values in results.items():
+        for size, (median, p95), (single, _) in zip(
+            sizes, values, results["Singlethread"]
+        ):
+            print(
+                f"{label:<16} {size:>10} {median / 1e6:>10.3f} "
+                f"{p95 / 1e6:>10.3f} {single / median:>8.2f}"
+            )
+
+    if file is not None:
+        root, ext = path.splitext(file)
+        for stat, stat_file in enumerate([file, f"{root}_p95{ext}"]):
+            with open(stat_file, "w", newline="") as csv_file:
+                csv_writer = writer(csv_file)
+                csv_writer.writerow(
+                    ["Execution time for parallel sum", ""] + [""] * len(sizes)
+                )
+                csv_writer.writerow(["", "", "Array Size"] + [""] * (len(sizes) - 1))
+                for row, (label, values) in enumerate(results.items()):
+                    csv_writer.writerow(
+                        ["Tool" if row == 0 else "", label]
+                        + [f"{value[stat] / 1e6:.2E}" for value in values]
+                    )
+    return results
+
+
+def benchmark_main(argv):
+    """
+    Parameters:
+        argv: [sizes, thread counts, csv file], sizes and thread counts comma separated
+    """
+    sizes = argv[0] if len(argv) > 0 else "1e3,1e4,1e5,1e6"
+    thread_counts = argv[1] if len(argv) > 1 else "2,4,8"
+    benchmark(
+        [int(float(i)) for i in sizes.split(",")],
+        [int(i) for i in thread_counts.split(",")],
+        file=argv[2] if len(argv) > 2 else None,
+    )
+
+
 def main(argv):
     if len(argv) < 2:
-        raise Exception("Enter list size")
+        raise Exception("Enter list size, benchmark or stream")
+    if argv[1] == "benchmark":
+        return benchmark_main(argv[2:])
+    if argv[1] == "stream":
+        if len(argv) < 3:
+            raise Exception("Enter binary file to sum")
+        total, n_items, throughput = sum_stream(
+            argv[2], n_processes=int(argv[3]) if len(argv) > 3 else 2
+        )
+        print(f"Sum of {n_items} items: {total}")
+        print(f"Throughput: {throughput:.2E} items/s")
+        return
     list_ = [randint(1, 100) for _ in range(int(argv[1]))]
-    print(list_)
     start = time()
     print(f"Sum using multithread: {sum_multithread_n_threads(list_)}")
     # sleep_multithread(5)
@@ -1,36 +1,256 @@
 import gymnasium as gym
-from numpy import arctan, pi
+from numpy import arctan, pi, linspace, zeros, array, where, dtype, searchsorted
+from numpy import load as np_load, save as np_save, int64, float64, inf
+from numpy.random import rand, randint
 from random import random, choice
 from json import load, dump
 from enum import Enum
+from re import compile
+from bisect import bisect
+from math import prod
+from collections import deque
+from csv import DictWriter
+from time import perf_counter_ns
 
 
 Algorithm = Enum("Algorithm", [("Q_LEARNING", True), ("SARSA", False)])
+TableType = Enum("TableType", [("DICT", 0), ("DENSE", 1)])
+
+DEFAULT_BINS = [
+    (-4.8, 4.8, 10),  # position
+    (-3.0, 3.0, 10),  # velocity
+    (-0.42, 0.42, 20),  # angle
+    (-3.5, 3.5, 20),  # angular velocity
+]
+
+Q_DTYPE = dtype(
+    [
+        ("position", int64),
+        ("velocity", int64),
+        ("angle", int64),
+        ("ang_velocity", int64),
+        ("action", int64),
+        ("value", float64),
+    ]
+)
+LEGACY_KEY = compile(r"\(dict_values\(\[(.*)\]\), (\d+)\)")
 
 
 class QTable(dict):
     def __init__(self, file=None):
         """
-        Subclass of dict representing q-table
+        Subclass of dict representing q-table, indexed by (State.key, action)
         Parameters:
-            file: Q-table from json
+            file: Q-table from json (rows [position, velocity, angle, ang_velocity, action, value]
+                or a legacy table keyed by "(dict_values([...]), action)" strings) or from .npy file
         Returns: Q-table for agent
         """
         if file is not None:
-            super().__init__(load(open(file, "r")))
+            if file.endswith(".npy"):
+                rows = np_load(file).tolist()
+            else:
+                rows = load(open(file, "r"))
+            if isinstance(rows, dict):
+                rows = QTable.legacy_rows(rows)
+            super().__init__(((tuple(row[:4]), row[4]), row[5]) for row in rows)
+
+    def get(self, state, action, default):
+        return super().get((state.key, action), default)
+
+    def set(self, state, action, value):
+        self[(state.key, action)] = value
+
+    rows = lambda self, states, actions: array(
+        [[self.get(state, action, 0) for action in actions] for state in states]
+    )
+    rows.__doc__ = """Parameters:
+        states: List of State objects
+        actions: Actions to read for each state
+    Returns: (len(states), len(actions)) array of Q-values (0 for unknown pairs)
+    """
+
+    @staticmethod
+    def legacy_rows(table):
+        """
+        Parameters:
+            table: Dict loaded from a json Q-table saved with string keys
+        Returns: List of rows [position, velocity, angle, ang_velocity, action, value]
+        """
+        rows = []
+        for key, value in table.items():
+            match = LEGACY_KEY.fullmatch(key)
+            if match is None:
+                raise Exception(f"Invalid Q-table key: {key}")
+            state, action = match.groups()
+            rows.append([int(i) for i in state.split(", ")] + [int(action), value])
+        return rows
+
+    def save(self, file):
+        """
+        Dumps Q-table to json file as rows [position, velocity, angle, ang_velocity, action, value],
+        or to a sorted Q_DTYPE array if file ends with .npy (loadable by MappedQTable)
+        Parameters:
+            file: File directory to dump Q-table to
+        """
+        if not file.endswith(".npy"):
+            dump(
+                [[*state, action, value] for (state, action), value in self.items()],
+                open(file, "w"),
+            )
+            return
+        rows = array(
+            [(*state, action, value) for (state, action), value in self.items()],
+            dtype=Q_DTYPE,
+        )
+        rows.sort()
+        with open(file, "wb") as file_:
+            np_save(file_, rows)
+
+
+class MappedQTable:
+    def __init__(self, file):
+        """
+        Read-only Q-table memory-mapped from a .npy file saved by QTable.save,
+        looked up by binary search without parsing the file
+        Parameters:
+            file: .npy file with a sorted Q_DTYPE array
+        Returns: Q-table for inference agents
+        """
+        self.table = np_load(file, mmap_mode="r")
+        if self.table.dtype != Q_DTYPE:
+            raise Exception("Q-table file is not a sorted Q_DTYPE array")
+
+    def find(self, keys):
+        """
+        Parameters:
+            keys: List of (position, velocity, angle, ang_velocity, action) tuples
+        Returns: Array with the value of each key (NaN for unknown keys)
+        """
+        queries = array([(*key, -inf) for key in keys], dtype=Q_DTYPE)
+        idx = searchsorted(self.table, queries).clip(max=len(self.table) - 1)
+        found = self.table[idx]
+        known = found["action"] == queries["action"]
+        for field in ["position", "velocity", "angle", "ang_velocity"]:
+            known &= found[field] == queries[field]
+        return where(known, found["value"], float("nan"))
 
     def get(self, state, action, default):
-        return super().get(str(tuple([state.values(), action])), default)
+        if len(self.table) == 0:
+            return default
+        value = self.find([(*state.key, action)])[0]
+        return default if value != value else float(value)
 
     def set(self, state, action, value):
-        self[str(tuple([state.values(), action]))] = value
+        raise Exception("Memory-mapped Q-tables are read-only")
+
+    def rows(self, states, actions):
+        """
+        Parameters:
+            states: List of State objects
+            actions: Actions to read for each state
+        Returns: (len(states), len(actions)) array of Q-values (0 for unknown pairs)
+        """
+        if len(self.table) == 0:
+            return zeros((len(states), len(actions)))
+        values = self.find(
+            [(*state.key, action) for state in states for action in actions]
+        ).reshape(len(states), len(actions))
+        return where(values == values, values, 0)
+
+    __len__ = lambda self: len(self.table)
+    __len__.__doc__ = """Returns: Number of (state, action) pairs in the table"""
+
+    def save(self, file):
+        """
+        Dumps Q-table to .npy file
+        Parameters:
+            file: File directory to dump array to
+        """
+        with open(file, "wb") as file_:
+            np_save(file_, self.table)
+
+
+def convert_q_table(file, new_file):
+    """
+    Converts a json Q-table (row or legacy string-key format) or .npy Q-table,
+    the format of new_file is chosen by its extension (.npy loadable by MappedQTable, json otherwise)
+    Parameters:
+        file: Q-table to convert
+        new_file: File directory to dump the converted Q-table to
+    """
+    QTable(file).save(new_file)
+
+
+class DenseQTable:
+    def __init__(self, bins=DEFAULT_BINS, file=None, n_actions=2):
+        """
+        Q-table preallocated as a NumPy array over discretized observations
+        Parameters:
+            bins: List of (low, high, n_bins) for position, velocity, angle and angular velocity,
+                values outside [low, high] go to the first/last bin
+            file: Q-table from .npy file with shape (*n_bins, n_actions)
+            n_actions: Number of actions
+        Returns: Q-table for agent
+        """
+        self.bins = bins
+        self.edges = [
+            linspace(low, high, n + 1)[1:-1].tolist() for low, high, n in bins
+        ]
+        shape = tuple(n for *_, n in bins) + (n_actions,)
+        self.values = zeros(shape) if file is None else np_load(file)
+        if self.values.shape != shape:
+            raise Exception("Q-table file does not match bins")
+        self.flat = self.values.reshape(-1, n_actions)
+        self.strides = [prod(shape[i + 1 : -1]) for i in range(len(bins))]
+
+    def index(self, state):
+        """
+        Parameters:
+            state: State object to analyze
+        Returns: Row of the flat Q-table for state (cached in state)
+        """
+        if state.index is None:
+            state.index = sum(
+                bisect(edges, value) * stride
+                for edges, value, stride in zip(
+                    self.edges, state.observation, self.strides
+                )
+            )
+        return state.index
+
+    def get(self, state, action, default=None):
+        return float(self.flat[self.index(state), action])
+
+    def set(self, state, action, value):
+        self.flat[self.index(state), action] = value
+
+    rows = lambda self, states, actions: self.flat[
+        [self.index(state) for state in states]
+    ][:, actions]
+    rows.__doc__ = """Parameters:
+        states: List of State objects
+        actions: Actions to read for each state
+    Returns: (len(states), len(actions)) array of Q-values
+    """
+
+    __len__ = lambda self: self.flat.shape[0] * self.flat.shape[1]
+    __len__.__doc__ = """Returns: Number of (state, action) cells in the table"""
+
+    def save(self, file):
+        """
+        Dumps Q-table to .npy file
+        Parameters:
+            file: File directory to dump array to
+        """
+        with open(file, "wb") as file_:
+            np_save(file_, self.values)
 
 
 class State(dict):
     def __init__(
         self,
         observation,
-        _=None,
+        env_reward=None,
         terminated=None,
         truncated=None,
         __=None,
@@ -40,7 +260,7 @@ class State(dict):
         Subclass of dict a agent for CartPole Problem
         Parameters:
             observation: Observation object provided by simulator
-            _: Unused value from simulator object
+            env_reward: Reward given by simulator
             terminated: Check if simulation has achieved end state
             truncated: Check if simulation has achieved truncated state
             __: Unused value from simulator object
@@ -49,10 +269,138 @@ class State(dict):
         """
         self.terminated = terminated
         self.truncated = truncated
+        self.env_reward = env_reward
+        self.observation = observation
+        self.index = None
         self["position"] = int(precision * observation[0])  # [-4.8PREC, 4.8PREC]
         self["velocity"] = int(precision * observation[1])  # [-inf, +inf]
         self["angle"] = int(precision * observation[2])  # [-0.41PREC, 0.41PREC]
         self["ang_velocity"] = int(precision * observation[3])  # [-inf, +inf]
+        self.key = (
+            self["position"],
+            self["velocity"],
+            self["angle"],
+            self["ang_velocity"],
+        )
+
+
+class Metrics:
+    FIELDS = [
+        "episode",
+        "env",
+        "return",
+        "length",
+        "q_table_size",
+        "action_ns",
+        "step_ns",
+        "update_ns",
+        "timed_steps",
+        "duration_ns",
+    ]
+
+    def __init__(self, size=1000, sample_every=10):
+        """
+        Ring buffer with one record per finished episode
+        Parameters:
+            size: Number of episode records kept (oldest are dropped)
+            sample_every: Times 1 out of sample_every steps (0 disables timing)
+        Returns: Metrics for Agent.run_episodes and Agent.run_vector_episodes
+        """
+        self.records = deque(maxlen=size)
+        self.sample_every = sample_every
+        self.episodes = 0
+        self.returns = {}
+        self.lengths = {}
+        self.starts = {}
+        self.times = {}
+        self.timed_steps = {}
+
+    def reset(self):
+        """
+        Drops the accumulators of unfinished episodes, called at the start of each run
+        """
+        self.returns.clear()
+        self.lengths.clear()
+        self.starts.clear()
+        self.times.clear()
+        self.timed_steps.clear()
+
+    timed = lambda self, step: self.sample_every and step % self.sample_every == 0
+    timed.__doc__ = """Parameters:
+        step: Index of the current step
+    Returns: True if the step should be timed
+    """
+
+    def add_times(self, action_ns, step_ns, update_ns, env=0):
+        """
+        Parameters:
+            action_ns: Time choosing actions
+            step_ns: Time in env.step
+            update_ns: Time updating the Q-table
+            env: Index of the environment
+        """
+        times = self.times.setdefault(env, [0, 0, 0])
+        times[0] += action_ns
+        times[1] += step_ns
+        times[2] += update_ns
+        self.timed_steps[env] = self.timed_steps.get(env, 0) + 1
+
+    def add_step(self, reward, env=0):
+        """
+        Parameters:
+            reward: Reward given by simulator
+            env: Index of the environment
+        """
+        if env not in self.lengths:
+            self.returns[env], self.lengths[env] = 0, 0
+            self.starts[env] = perf_counter_ns()
+        self.returns[env] += reward
+        self.lengths[env] += 1
+
+    def end_episode(self, q_table_size, env=0):
+        """
+        Stores a record for the finished episode, with the mean timing of its timed steps
+        Parameters:
+            q_table_size: Number of entries in the Q-table
+            env: Index of the environment
+        """
+        times = self.times.pop(env, [0, 0, 0])
+        timed_steps = self.timed_steps.pop(env, 0)
+        self.records.append(
+            {
+                "episode": self.episodes,
+                "env": env,
+                "return": float(self.returns.pop(env, 0)),
+                "length": self.lengths.pop(env, 0),
+                "q_table_size": q_table_size,
+                "action_ns": times[0] / (timed_steps or 1),
+                "step_ns": times[1] / (timed_steps or 1),
+                "update_ns": times[2] / (timed_steps or 1),
+                "timed_steps": timed_steps,
+                "duration_ns": perf_counter_ns() - self.starts.pop(env, 0),
+            }
+        )
+        self.episodes += 1
+
+    def to_csv(self, file):
+        """
+        Parameters:
+            file: File directory to dump records to as csv
+        """
+        with open(file, "w", newline="") as file_:
+            writer = DictWriter(file_, Metrics.FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def to_jsonl(self, file):
+        """
+        Parameters:
+            file: File directory to dump records to as json lines
+        """
+        with open(file, "w") as file_:
+            for record in self.records:
+                dump(record, file_)
+                file_.write("\n")
 
 
 class Agent:
@@ -68,6 +416,9 @@ class Agent:
         train=True,
         algorithm=Algorithm.Q_LEARNING,
         state_precision=1e4,
+        table_type=TableType.DICT,
+        bins=DEFAULT_BINS,
+        metrics=None,
     ):
         """
         Agent for CartPole problem
@@ -76,19 +427,31 @@ class Agent:
             er: Exploration rate
             gamma: Bellman Gamma
             alpha_er: Weight for smoothing exploration rate function
-            file: Json file for Q-table
+            file: Json or .npy file for Q-table (.npy files are memory-mapped when train is False)
             train: Makes agent trainable
             algorithm: Algorithm for training agent
             state_precision: Precision in continuos to discrete values
+            table_type: TableType.DICT for an unbounded dict Q-table, TableType.DENSE for a NumPy array over bins
+            bins: List of (low, high, n_bins) for each observation value, used by dense Q-tables
+            metrics: Metrics object to record episodes in, None disables instrumentation
         Returns: Agent for CartPole Problem
         """
         self.trainable = train
-        self.q_table = QTable(file)
+        match table_type:
+            case TableType.DICT if not train and str(file).endswith(".npy"):
+                self.q_table = MappedQTable(file)
+            case TableType.DICT:
+                self.q_table = QTable(file)
+            case TableType.DENSE:
+                self.q_table = DenseQTable(bins, file, len(Agent.ACTION_SPACE))
+            case _:
+                raise Exception("Invalid table type for agent")
         self.lr = lr
         self.er = er if self.trainable else 0
         self.alpha_er = alpha_er
         self.algorithm = algorithm
         self.state_precision = state_precision
+        self.metrics = metrics
 
         if not self.trainable and file is None:
             raise Exception("Non trainable agents must have a file param")
@@ -109,6 +472,21 @@ class Agent:
             key=lambda action: self.q_table.get(state, action, 0),
         )
 
+    def next_actions(self, states):
+        """
+        Parameters:
+            states: List of State objects to analyze
+        Returns: Array with the best action from each state
+        """
+        actions = self.q_table.rows(states, Agent.ACTION_SPACE).argmax(axis=1)
+        if self.trainable:
+            actions = where(
+                rand(len(states)) > self.er,
+                randint(0, len(Agent.ACTION_SPACE), len(states)),
+                actions,
+            )
+        return actions
+
     reward = lambda self, state: (
         1 if state["angle"] == 0 else (-1 if state.terminated else 0)
     )
@@ -144,34 +522,58 @@ class Agent:
             q + self.lr * (self.reward(state) + self.gamma * next_q - q),
         )
 
-    def run_episodes(self, n, seed=None, on_episode_end=None):
+    def run_episodes(self, n, seed=None, on_episode_end=None, render=True):
         """
         Run simulation for n episodes
         Parameters:
             n: Number of episodes to run
             seed: Seed for each reset
             on_episode_end: Lambda function to run after the end of each episode
+            render: Renders the simulation, False runs it headless
         """
         self.episodes = n
-        env = gym.make("CartPole-v1", render_mode="human")
+        env = gym.make("CartPole-v1", render_mode="human" if render else None)
         observation, _ = env.reset(seed=seed) if seed is not None else env.reset()
 
         self.state = State(observation, precision=self.state_precision)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.reset()
         for i in range(n):
             self.current_episode = i
+            timed = metrics is not None and metrics.timed(i)
+            if timed:
+                start = perf_counter_ns()
             action = self.next_action(self.state)
+            if timed:
+                action_time = perf_counter_ns()
 
             if on_episode_end is not None:
                 on_episode_end()
 
+            if timed:
+                step_start = perf_counter_ns()
             old_state = self.state
-            self.state = State(*env.step(action))
+            self.state = State(*env.step(action), precision=self.state_precision)
+            if timed:
+                step_time = perf_counter_ns()
 
             if self.trainable:
                 self.update(old_state, action, self.state)
                 self.er = self.er * -arctan(i / (self.alpha_er * n))
 
+            if metrics is not None:
+                if timed:
+                    metrics.add_times(
+                        action_time - start,
+                        step_time - step_start,
+                        perf_counter_ns() - step_time,
+                    )
+                metrics.add_step(self.state.env_reward)
+
             if self.state.terminated or self.state.truncated:
+                if metrics is not None:
+                    metrics.end_episode(len(self.q_table))
                 observation, _ = (
                     env.reset(seed=seed) if seed is not None else env.reset()
                 )
@@ -180,6 +582,90 @@ class Agent:
         self.episodes = None
         self.current_episode = None
 
+    def run_vector_episodes(
+        self, n, n_envs=4, asynchronous=False, seed=None, on_episode_end=None
+    ):
+        """
+        Run headless simulation for n episodes on n_envs environments at once
+        Parameters:
+            n: Number of episodes to run (each one steps every environment)
+            n_envs: Number of CartPole copies
+            asynchronous: Steps environments in subprocesses (AsyncVectorEnv) instead of sequentially
+            seed: Seed for the first reset (environment k uses seed + k)
+            on_episode_end: Lambda function to run after the end of each episode
+        """
+        self.episodes = n
+        envs = (
+            gym.vector.AsyncVectorEnv if asynchronous else gym.vector.SyncVectorEnv
+        )([lambda: gym.make("CartPole-v1")] * n_envs)
+        observations, _ = envs.reset(seed=seed)
+
+        states = [State(obs, precision=self.state_precision) for obs in observations]
+        # Vector environments reset on the step after an episode ends, that step is not a transition
+        resetting = zeros(n_envs, dtype=bool)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.reset()
+        for i in range(n):
+            self.current_episode = i
+            timed = metrics is not None and metrics.timed(i)
+            if timed:
+                start = perf_counter_ns()
+            actions = self.next_actions(states)
+            if timed:
+                action_time = perf_counter_ns()
+
+            if on_episode_end is not None:
+                on_episode_end()
+
+            if timed:
+                step_start = perf_counter_ns()
+            observations, rewards, terminated, truncated, _ = envs.step(actions)
+            if timed:
+                step_time = perf_counter_ns()
+            old_states = states
+            states = [
+                State(
+                    observations[k],
+                    rewards[k],
+                    terminated[k],
+                    truncated[k],
+                    precision=self.state_precision,
+                )
+                for k in range(n_envs)
+            ]
+
+            if self.trainable:
+                for k in range(n_envs):
+                    if not resetting[k]:
+                        self.update(old_states[k], int(actions[k]), states[k])
+                self.er = self.er * -arctan(i / (self.alpha_er * n))
+
+            if metrics is not None:
+                # Each environment still in an episode is charged its share of the vector step
+                active = n_envs - int(resetting.sum())
+                if timed and active:
+                    end_time = perf_counter_ns()
+                    times = [
+                        (action_time - start) / active,
+                        (step_time - step_start) / active,
+                        (end_time - step_time) / active,
+                    ]
+                for k in range(n_envs):
+                    if resetting[k]:
+                        continue
+                    if timed:
+                        metrics.add_times(*times, k)
+                    metrics.add_step(rewards[k], k)
+                    if terminated[k] or truncated[k]:
+                        metrics.end_episode(len(self.q_table), k)
+
+            resetting = terminated | truncated
+
+        envs.close()
+        self.episodes = None
+        self.current_episode = None
+
     def episode_count(self):
         """
         Run as on_episode_end parameter to check progress of simulation
@@ -190,8 +676,8 @@ class Agent:
 
         return f"{self.current_episode} / {self.episodes} {int(self.current_episode/self.episodes * 100)}%"
 
-    save = lambda self, file: dump(dict(self.q_table), open(file, "w"))
-    save.__doc__ = """Dumps Q-table to json file
+    save = lambda self, file: self.q_table.save(file)
+    save.__doc__ = """Dumps Q-table to json file (.npy file for dense Q-tables or if file ends with .npy)
     Parameters:
         file: File directory to dump json to
     """
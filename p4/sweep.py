@@ -0,0 +1,146 @@
+from lib import Agent, Algorithm, Metrics, TableType, gym
+from csv import writer
+from itertools import product
+from multiprocessing import Pool
+from os import makedirs, path, remove, replace
+from random import seed as set_seed
+from numpy.random import seed as np_set_seed
+from sys import argv
+from time import perf_counter
+
+DEFAULT_GRID = {
+    "lr": [0.1, 0.5],
+    "er": [0.1],
+    "gamma": [0.9, 0.99],
+    "alpha_er": [1e3],
+    "state_precision": [1e1, 1e2],
+    "algorithm": [Algorithm.Q_LEARNING, Algorithm.SARSA],
+}
+
+
+def expand_grid(grid):
+    """
+    Parameters:
+        grid: Dict {Agent parameter: list of values}
+    Returns: List of dicts, one per combination of values
+    """
+    return [dict(zip(grid.keys(), values)) for values in product(*grid.values())]
+
+
+def warm_up():
+    """
+    Pool initializer, pays gymnasium's CartPole import cost once per worker
+    """
+    gym.make("CartPole-v1").close()
+
+
+def train_config(task):
+    """
+    Trains one headless agent
+    Parameters:
+        task: Tuple (config index, Agent parameters, n_steps, seed, directory)
+    Returns: Tuple (config index, list of (episode return, episode wall time), total wall time),
+        the Q-table is saved as q_table_<config index>.json (.npy for dense tables) in directory
+    """
+    idx, params, n_steps, seed, directory = task
+    set_seed(seed)
+    np_set_seed(seed)
+    agent = Agent(**params, metrics=Metrics(size=None, sample_every=0))
+
+    start = perf_counter()
+    agent.run_episodes(n_steps, seed=seed, render=False)
+    elapsed = perf_counter() - start
+    agent.save(table_file(directory, idx, params))
+    episodes = [
+        (record["return"], record["duration_ns"] / 1e9)
+        for record in agent.metrics.records
+    ]
+    return idx, episodes, elapsed
+
+
+table_file = lambda directory, idx, params: path.join(
+    directory,
+    f"q_table_{idx}"
+    + (".npy" if params.get("table_type") == TableType.DENSE else ".json"),
+)
+table_file.__doc__ = """Parameters:
+    directory: Sweep output directory
+    idx: Config index
+    params: Agent parameters of the config
+Returns: File the config's Q-table is saved to
+"""
+
+
+def run_sweep(grid, n_steps, directory, processes=None, seed=0, last_episodes=100):
+    """
+    Trains one headless agent per configuration of grid across a process pool
+    Parameters:
+        grid: Dict {Agent parameter: list of values}
+        n_steps: Number of simulation steps per agent (Agent.run_episodes n)
+        directory: Output directory for results.csv, episodes.csv and the best Q-table
+        processes: Number of worker processes (None for cpu count)
+        seed: Seed used by every agent
+        last_episodes: Number of final episodes averaged to rank configurations
+    Returns: Tuple with index and Agent parameters of the best configuration (lowest index on ties)
+    """
+    makedirs(directory, exist_ok=True)
+    configs = expand_grid(grid)
+    best, best_score = None, None
+    tasks = [
+        (idx, params, n_steps, seed, directory) for idx, params in enumerate(configs)
+    ]
+
+    with open(path.join(directory, "results.csv"), "w", newline="") as results, open(
+        path.join(directory, "episodes.csv"), "w", newline=""
+    ) as episodes_file:
+        results_writer, episodes_writer = writer(results), writer(episodes_file)
+        results_writer.writerow(
+            ["config"]
+            + list(grid.keys())
+            + ["episodes", "mean_return", "max_return", "last_mean_return", "wall_time"]
+        )
+        episodes_writer.writerow(["config", "episode", "return", "wall_time"])
+
+        with Pool(processes, initializer=warm_up) as pool:
+            for idx, episodes, elapsed in pool.imap_unordered(train_config, tasks):
+                returns = [i for i, _ in episodes] or [0]
+                score = sum(returns[-last_episodes:]) / len(returns[-last_episodes:])
+                results_writer.writerow(
+                    [idx]
+                    + [getattr(i, "name", i) for i in configs[idx].values()]
+                    + [
+                        len(episodes),
+                        sum(returns) / len(returns),
+                        max(returns),
+                        score,
+                        elapsed,
+                    ]
+                )
+                episodes_writer.writerows(
+                    [idx, i, *episode] for i, episode in enumerate(episodes)
+                )
+                results.flush()
+                episodes_file.flush()
+
+                file = table_file(directory, idx, configs[idx])
+                if best_score is None or (score, -idx) > (best_score, -best):
+                    if best is not None:
+                        remove(table_file(directory, best, configs[best]))
+                    best, best_score = idx, score
+                else:
+                    remove(file)
+
+    best_file = table_file(directory, best, configs[best])
+    replace(best_file, path.join(directory, "best_" + path.basename(best_file)))
+    return best, configs[best]
+
+
+def main(argv):
+    if len(argv) < 3:
+        raise Exception("Enter number of steps per agent and output directory")
+    best, params = run_sweep(DEFAULT_GRID, int(argv[1]), argv[2])
+    print(f"Best configuration {best}: {params}")
+
+
+if __name__ == "__main__":
+    main(argv)
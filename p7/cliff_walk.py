@@ -1,7 +1,44 @@
 from enum import Enum
+from numpy import arange, array, asarray, full, where, zeros
 
 Action = Enum("Action", [("UP", 0), ("RIGHT", 1), ("DOWN", 2), ("LEFT", 3)])
 
+START = 36
+GOAL = 47
+HOLES = range(37, 47)
+
+
+def neighbors(p):
+    """
+    Parameters:
+        p: Position in the 4x12 grid
+    Returns: List with the square reached by each action (UP, RIGHT, DOWN, LEFT), walls keep the position
+    """
+    match p:
+        case p if p <= 11:
+            return [p, p if p == 11 else p + 1, p + 12, p if p == 0 else p - 1]
+        case p if p <= 23:
+            return [p - 12, p if p == 23 else p + 1, p + 12, p if p == 12 else p - 1]
+        case p if p <= 35:
+            return [p - 12, p if p == 35 else p + 1, p + 12, p if p == 24 else p - 1]
+        case _:
+            return [p - 12, p if p == 47 else p + 1, p, p if p == 36 else p - 1]
+
+
+NEIGHBORS = [neighbors(p) for p in range(48)]
+NEXT_POSITIONS = [[p if i in HOLES else i for i in NEIGHBORS[p]] for p in range(48)]
+TERMINATES = [[i in HOLES or i == GOAL for i in NEIGHBORS[p]] for p in range(48)]
+REWARDS = [
+    [-100 if i in HOLES else (100 if i == GOAL else -1) for i in NEIGHBORS[p]]
+    for p in range(48)
+]
+
+NEIGHBOR_TABLE = array(NEIGHBORS)
+TRANSITION_TABLE = array(NEXT_POSITIONS)
+TERMINATION_TABLE = array(TERMINATES)
+REWARD_TABLE = array(REWARDS)
+SELF_LOOP_TABLE = NEIGHBOR_TABLE == arange(48)[:, None]
+
 
 class CliffWalk:
     def __init__(self):
@@ -35,24 +72,13 @@ class CliffWalk:
         Raises:
             ValueError: If the action is invalid.
         """
-        if action not in [i for i in Action]:
+        if not isinstance(action, Action):
             raise ValueError("Invalid action")
 
         p = self.position
         a = action.value
-        match p:
-            case p if p <= 11:
-                arr = [p, p if p == 11 else p + 1, p + 12, p if p == 0 else p - 1]
-            case p if p <= 23:
-                arr = [p - 12, p if p == 23 else p + 1, p + 12, p if p == 12 else p - 1]
-            case p if p <= 35:
-                arr = [p - 12, p if p == 35 else p + 1, p + 12, p if p == 24 else p - 1]
-            case _:
-                arr = [p - 12, p if p == 47 else p + 1, p, p if p == 36 else p - 1]
-
-        in_hole = arr[a] in [i for i in range(37, 47)]
-        self.position = p if in_hole else arr[a]
-        self.terminated = in_hole or arr[a] == 47
+        self.position = NEXT_POSITIONS[p][a]
+        self.terminated = TERMINATES[p][a]
 
     def print_board(self):
         """
@@ -70,6 +96,68 @@ class CliffWalk:
         print("0: Move up | 1: Move right | 2: Move down | 3: Move left")
 
 
+class BatchedCliffWalk:
+    def __init__(self, n_agents, max_steps=None):
+        """
+        CliffWalk for n_agents walkers at once, stepped through the precomputed (48, 4) tables.
+        Finished walkers are reset to the start on the same step.
+
+        Parameters:
+            n_agents: Number of walkers.
+            max_steps: Steps after which a walker's episode is truncated (None for no limit).
+        """
+        self.n_agents = n_agents
+        self.max_steps = max_steps
+        self.positions = full(n_agents, START)
+        self.steps = zeros(n_agents, dtype=int)
+
+    def reset(self, seed=None):
+        """
+        Resets every walker to the starting position
+
+        Parameters:
+            seed: Unused, kept for gymnasium compatibility.
+
+        Returns:
+            Tuple with (n_agents,) array of positions and info dict.
+        """
+        self.positions[:] = START
+        self.steps[:] = 0
+        return self.positions.copy(), {}
+
+    def step(self, actions):
+        """
+        Moves every walker by its action (0: UP, 1: RIGHT, 2: DOWN, 3: LEFT).
+
+        Parameters:
+            actions: (n_agents,) array of actions.
+
+        Returns:
+            Tuple (observations, rewards, terminated, truncated, info) of (n_agents,) arrays,
+            info["final_observation"] holds the positions before finished walkers were reset.
+        """
+        actions = asarray(actions)
+        positions = TRANSITION_TABLE[self.positions, actions]
+        rewards = REWARD_TABLE[self.positions, actions]
+        terminated = TERMINATION_TABLE[self.positions, actions]
+        self.steps += 1
+        truncated = (
+            ~terminated & (self.steps >= self.max_steps)
+            if self.max_steps is not None
+            else zeros(self.n_agents, dtype=bool)
+        )
+        done = terminated | truncated
+        self.positions = where(done, START, positions)
+        self.steps[done] = 0
+        return (
+            self.positions.copy(),
+            rewards,
+            terminated,
+            truncated,
+            {"final_observation": positions},
+        )
+
+
 if __name__ == "__main__":
     cw = CliffWalk()
     cw.print_board()
@@ -1,8 +1,11 @@
 import gymnasium as gym
-from numpy import argmax, exp, max as nmax, array
+from numpy import argmax, exp, max as nmax, where, zeros
 from numpy.random import choice, rand
 from math import inf
 from enum import Enum
+from collections import deque
+from time import perf_counter
+from cliff_walk import NEIGHBOR_TABLE, SELF_LOOP_TABLE
 
 env = None
 
@@ -79,6 +82,63 @@ class State:
 )"""
 
 
+class NStepBuffer:
+    def __init__(self, n, gamma):
+        """
+        Fixed-size circular buffers holding the last n steps of the TD window
+
+        The discounted return (oldest reward weighted by gamma**0) is kept up to date
+        in O(1) amortized time: the window is split at the last multiple of n into
+        the suffix of the previous block, whose discounted suffix sums are computed
+        once when the block is full, and the prefix of the current block, which is
+        accumulated as rewards arrive.
+
+        Parameters:
+            n: Number of steps in the window.
+            gamma: Discount factor.
+        """
+        self.n = n
+        self.powers = [gamma**i for i in range(n + 1)]
+        self.rewards = [0.0] * n
+        self.states = [None] * n
+        self.next_states = [0] * n
+        self.suffix = [0.0] * (n + 1)
+        self.prefix = 0.0
+        self.discounted_return = 0.0
+        self.slot = -1
+
+    def push(self, state, next_state):
+        """
+        Adds a step to the window, overwriting the oldest one once the window is full.
+
+        Parameters:
+            state: The state reached in this step, with its reward.
+            next_state: The state the agent moved to.
+        """
+        n, gamma = self.n, self.powers[1]
+        slot = self.slot = (self.slot + 1) % n
+        if slot == 0:
+            suffix, rewards = self.suffix, self.rewards
+            for i in range(n - 1, -1, -1):
+                suffix[i] = rewards[i] + gamma * suffix[i + 1]
+            self.prefix = 0.0
+
+        self.rewards[slot] = state.reward
+        self.states[slot] = state
+        self.next_states[slot] = next_state
+        self.prefix += self.powers[slot] * state.reward
+        self.discounted_return = (
+            self.suffix[slot + 1] + self.powers[n - 1 - slot] * self.prefix
+        )
+
+    @property
+    def oldest_next_state(self):
+        """
+        Returns the next state of the oldest step in the window.
+        """
+        return self.next_states[(self.slot + 1) % self.n]
+
+
 class Algorithm(Enum):
     TD = True
 
@@ -98,17 +158,17 @@ class Algorithm(Enum):
                 self.gamma = kwargs.get("gamma", 0.9)
                 self.seed = kwargs.get("seed", None)
                 self.policy_type = kwargs.get("p_type", Policy.GREEDY)
-                self.v_table = [0] * 48
-                self.states = []
+                self.v_table = zeros(48)
             case _:
                 raise Algorithm._invalid_algorithm_exception()
         return self
 
-    def _run_step_end(self, on_step_end, on_step_end_args):
+    def _run_step_end(self, state, on_step_end, on_step_end_args):
         """
         Executes a callback at the end of a step.
 
         Parameters:
+            state: The state reached in this step.
             on_step_end: Callback function to run at the end of each step.
             on_step_end_params: Parameters passed to the callback function.
         """
@@ -122,12 +182,12 @@ class Algorithm(Enum):
                 Environ.OBSERVATION,
             ]
             environ_replacements = [
-                self.states[-1],
-                self.states[-1].reward,
-                self.states[-1].terminated,
-                self.states[-1].truncated,
-                self.states[-1].info,
-                self.states[-1].observation,
+                state,
+                state.reward,
+                state.terminated,
+                state.truncated,
+                state.info,
+                state.observation,
             ]
             args = []
             match on_step_end_args:
@@ -164,43 +224,41 @@ class Algorithm(Enum):
             return True
         return False
 
-    def _temporal_difference(self, n_steps, on_step_end, on_step_end_args):
+    def _temporal_difference(
+        self, n_steps, on_step_end, on_step_end_args, n_episodes, max_time, tol, window
+    ):
         """
-        Runs the Temporal Difference (TD) algorithm for the specified number of steps.
+        Runs the Temporal Difference (TD) algorithm until the first of its budgets is spent.
 
         Parameters:
             n_steps: Number of steps to run the algorithm for.
             on_step_end: Callback function to run at the end of each step.
             on_step_end_params: Parameters passed to the callback function.
+            n_episodes: Number of episodes to run the algorithm for (None for no limit).
+            max_time: Wall-clock budget in seconds (None for no limit).
+            tol: Convergence threshold on max |delta V| between episodes (None to disable).
+            window: Number of consecutive episodes that must stay below tol.
+
+        Returns:
+            Dict with steps, episodes, elapsed seconds, steps_per_sec, converged_at
+            (episodes to convergence, None if not converged) and the reason it stopped.
         """
 
-        def update_v_table(state, next_state):
+        def update_v_table(next_state):
             """
             Updates the value table (v_table) based on the Temporal Difference (TD) rule.
 
             Parameters:
-                state: The current state.
-                next_state: The next state in the sequence.
+                next_state: The oldest next state in the n-step window.
             """
             self.v_table[next_state] += self.alpha * (
                 (
-                    sum([self.gamma**i * rewards[i] for i in range(len(rewards))])
-                    + self.gamma**self.n * self.v_table[next_state]
+                    buffer.discounted_return
+                    + buffer.powers[self.n] * self.v_table[next_state]
                 )
                 - self.v_table[next_state]
             )
 
-        def update_rewards(state):
-            """
-            Updates the reward list by appending the current reward while maintaining a fixed size.
-
-            Parameters:
-                state: The current state with its reward.
-            """
-            if len(rewards) >= self.n:
-                rewards.pop(0)
-            rewards.append(state.reward)
-
         def run_next_step(action, next_state):
             """
             Runs a single step in the environment, updates the state, and handles termination.
@@ -218,19 +276,9 @@ class Algorithm(Enum):
             if state.observation == 47:
                 state.reward = 100
 
-            if len(self.states) >= self.n:
-                self.states.pop(0)
-
-            self.states.append(state)
-
-            if len(next_states) >= self.n:
-                next_states.pop(0)
+            buffer.push(state, next_state)
 
-            next_states.append(next_state)
-
-            update_rewards(state)
-
-            self._run_step_end(on_step_end, on_step_end_args)
+            self._run_step_end(state, on_step_end, on_step_end_args)
             return state
 
         def choose_action(state):
@@ -258,92 +306,120 @@ class Algorithm(Enum):
                 e = exp(arr - nmax(arr))
                 return e / e.sum()
 
+            def greedy(obs, adjacent):
+                """
+                Picks the neighbor with the highest value, ignoring moves into walls.
+
+                Parameters:
+                    obs: The current observation.
+                    adjacent: Row of NEIGHBOR_TABLE for obs.
+
+                Returns:
+                    The chosen action (random if every neighbor has the same value).
+                """
+                values = where(SELF_LOOP_TABLE[obs], -inf, self.v_table[adjacent])
+                if values.min() == values.max():
+                    return env.action_space.sample()
+                return int(argmax(values))
+
             obs = 36 if state is None else state.observation
-            match obs:
-                case obs if obs <= 11:
-                    adjacent = [
-                        obs,
-                        obs if obs == 11 else obs + 1,
-                        obs + 12,
-                        obs if obs == 0 else obs - 1,
-                    ]
-                case obs if obs <= 23:
-                    adjacent = [
-                        obs - 12,
-                        obs if obs == 23 else obs + 1,
-                        obs + 12,
-                        obs if obs == 12 else obs - 1,
-                    ]
-                case obs if obs <= 35:
-                    adjacent = [
-                        obs - 12,
-                        obs if obs == 35 else obs + 1,
-                        obs + 12,
-                        obs if obs == 24 else obs - 1,
-                    ]
-                case _:
-                    adjacent = [
-                        obs - 12,
-                        obs if obs + 1 == 48 else obs + 1,
-                        obs,
-                        obs if obs - 1 == 35 else obs - 1,
-                    ]
-            values = [self.v_table[i] if i != obs else -inf for i in adjacent]
+            adjacent = NEIGHBOR_TABLE[obs]
             match self.policy_type:
                 case Policy.GREEDY:
-                    act = (
-                        adjacent.index(adjacent[argmax(values)])
-                        if len(set(values)) != 1
-                        else env.action_space.sample()
-                    )
+                    act = greedy(obs, adjacent)
                 case Policy.SOFTMAX:
-                    act = choice(
-                        array(list(range(4))),
-                        p=softmax(array([self.v_table[i] for i in adjacent])),
-                    )
+                    act = int(choice(4, p=softmax(self.v_table[adjacent])))
                 case Policy.EPS_GREEDY:
                     if rand() < self.policy_type.epsilon:
-                        act = choice(array(list(range(4))))
+                        act = int(choice(4))
                     else:
-                        act = (
-                            adjacent.index(adjacent[argmax(values)])
-                            if len(set(values)) != 1
-                            else env.action_space.sample()
-                        )
+                        act = greedy(obs, adjacent)
                 case _:
                     raise Policy._invalid_policy_exception()
-            return act, adjacent[act]
+            return act, int(adjacent[act])
 
-        rewards = []
-        next_states = []
-        step = 0
+        buffer = NStepBuffer(self.n, self.gamma)
+        step = episodes = 0
+        converged_at, stopped = None, "steps"
+        deltas = deque(maxlen=window)
+        snapshot = self.v_table.copy()
         action, next_state = choose_action(None)
         state = None
+        start = perf_counter()
 
-        while step < self.n - 1:
+        while step < n_steps:
             state = run_next_step(action, next_state)
-            action, next_state = choose_action(state)
             step += 1
-
-        while step < int(n_steps):
-            state = run_next_step(action, next_state)
-            update_v_table(self.states[-self.n], next_states[-self.n])
+            if step >= self.n:
+                update_v_table(buffer.oldest_next_state)
             action, next_state = choose_action(state)
-            step += 1
 
-    def run(self, n_steps, on_step_end=None, on_step_end_args=None):
+            if state.terminated or state.truncated:
+                episodes += 1
+                if tol is not None and step >= self.n:
+                    deltas.append(abs(self.v_table - snapshot).max())
+                    snapshot[:] = self.v_table
+                    if len(deltas) == window and max(deltas) < tol:
+                        converged_at, stopped = episodes, "converged"
+                        break
+                if n_episodes is not None and episodes >= n_episodes:
+                    stopped = "episodes"
+                    break
+            if max_time is not None and perf_counter() - start >= max_time:
+                stopped = "time"
+                break
+
+        elapsed = perf_counter() - start
+        return {
+            "steps": step,
+            "episodes": episodes,
+            "elapsed": elapsed,
+            "steps_per_sec": step / elapsed if elapsed else 0.0,
+            "converged_at": converged_at,
+            "stopped": stopped,
+        }
+
+    def run(
+        self,
+        n_steps=inf,
+        on_step_end=None,
+        on_step_end_args=None,
+        n_episodes=None,
+        max_time=None,
+        tol=None,
+        window=10,
+    ):
         """
-        Runs the selected algorithm for a given number of steps.
+        Runs the selected algorithm until the first of its budgets is spent.
 
         Parameters:
             n_steps: Number of steps to run the algorithm.
             on_step_end: Optional callback to be executed at the end of each step.
             on_step_end_params: Parameters to be passed to the callback function.
+            n_episodes: Optional number of episodes to run the algorithm.
+            max_time: Optional wall-clock budget in seconds.
+            tol: Optional convergence threshold, training stops once the largest
+                change of the value table in each of the last window episodes is below it.
+            window: Number of episodes considered by the convergence criterion, at least 1.
+
+        Returns:
+            Dict with steps, episodes, elapsed, steps_per_sec, converged_at and stopped.
         """
+        if n_steps == inf and n_episodes is None and max_time is None and tol is None:
+            raise ValueError("At least one budget or convergence criterion is required")
+        if window < 1:
+            raise ValueError("Convergence window must be at least one episode")
         match self:
             case Algorithm.TD:
-                self._temporal_difference(n_steps, on_step_end, on_step_end_args)
-                self.states = []
+                return self._temporal_difference(
+                    n_steps,
+                    on_step_end,
+                    on_step_end_args,
+                    n_episodes,
+                    max_time,
+                    tol,
+                    window,
+                )
             case _:
                 raise Algorithm._invalid_algorithm_exception()
 
@@ -432,12 +508,23 @@ def main():
     print(alg)
     step_reward_list = []
     reward_list = []
-    alg.run(
+    report = alg.run(
         n_steps=1e10,
         on_step_end=track_episode_reward,
         on_step_end_args=[step_reward_list, Environ.STATE, reward_list],
+        n_episodes=1000,
+        tol=1e-3,
     )
     print(reward_list)
+    print(
+        f"{report['steps']} steps, {report['episodes']} episodes in {report['elapsed']:.2f}s "
+        f"({report['steps_per_sec']:.0f} steps/s), stopped by {report['stopped']}"
+        + (
+            f" after {report['converged_at']} episodes"
+            if report["converged_at"] is not None
+            else ""
+        )
+    )
 
 
 if __name__ == "__main__":
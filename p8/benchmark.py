@@ -0,0 +1,80 @@
+from main import PrioritizedReplayBuffer, ReplayBuffer
+from numpy import arange
+from numpy.random import rand, randint, randn, seed
+from sys import argv
+from time import perf_counter_ns
+
+
+def fill(buf):
+    """
+    Fills every slot of a buffer with random transitions, without going through push
+
+    Parameters:
+        buf: ReplayBuffer or PrioritizedReplayBuffer.
+    """
+    buf.observations[:] = randn(*buf.observations.shape)
+    buf.actions[:] = randint(0, 4, buf.max_size)
+    buf.rewards[:] = randn(buf.max_size)
+    buf.next_observations[:] = randn(*buf.next_observations.shape)
+    buf.dones[:] = rand(buf.max_size) < 0.01
+    buf.size = buf.max_size
+    if isinstance(buf, PrioritizedReplayBuffer):
+        buf.update_priorities(arange(buf.max_size), randn(buf.max_size))
+
+
+def measure(buf, batch_size, n_batches, n_pushes):
+    """
+    Times push, sample and (prioritized only) update_priorities on a full buffer
+
+    Parameters:
+        buf: ReplayBuffer or PrioritizedReplayBuffer.
+        batch_size: Number of transitions per sample.
+        n_batches: Number of batches sampled.
+        n_pushes: Number of transitions pushed.
+
+    Returns:
+        Tuple with mean push, sample and update times (ns).
+    """
+    fill(buf)
+    obs, next_obs = randn(8), randn(8)
+    start = perf_counter_ns()
+    for _ in range(n_pushes):
+        buf.push(obs, 0, 0.0, next_obs, False)
+    push_time = (perf_counter_ns() - start) / n_pushes
+
+    sample_time = update_time = 0
+    for _ in range(n_batches):
+        start = perf_counter_ns()
+        batch = buf.sample(batch_size)
+        sample_time += perf_counter_ns() - start
+        if isinstance(buf, PrioritizedReplayBuffer):
+            start = perf_counter_ns()
+            buf.update_priorities(batch[5], randn(batch_size))
+            update_time += perf_counter_ns() - start
+    return push_time, sample_time / n_batches, update_time / n_batches
+
+
+def main(argv):
+    capacity = int(float(argv[1])) if len(argv) > 1 else int(1e6)
+    batch_size = int(argv[2]) if len(argv) > 2 else 64
+    n_batches = int(argv[3]) if len(argv) > 3 else 1000
+    seed(0)
+    print(
+        f"{'buffer':<12} {'capacity':>9} {'MiB':>7} {'push us':>8} "
+        f"{'sample us':>10} {'update us':>10} {'samples/s':>11}"
+    )
+    for name, buf in [
+        ("uniform", ReplayBuffer(capacity)),
+        ("prioritized", PrioritizedReplayBuffer(capacity)),
+    ]:
+        push, sample, update = measure(buf, batch_size, n_batches, n_batches)
+        nbytes = buf.nbytes + (buf.tree.tree.nbytes if hasattr(buf, "tree") else 0)
+        print(
+            f"{name:<12} {capacity:>9} {nbytes / 2**20:>7.1f} {push / 1e3:>8.2f} "
+            f"{sample / 1e3:>10.2f} {update / 1e3:>10.2f} "
+            f"{batch_size / (sample + update) * 1e9:>11.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(argv)
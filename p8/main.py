@@ -1,8 +1,31 @@
 from keras.layers import Dense, Input
-from keras.models import Sequential, clone_model
-from numpy import argmax, array
-from random import random, sample
+from keras.models import Sequential, clone_model, model_from_json
+from numpy import (
+    abs as nabs,
+    arange,
+    argmax,
+    array,
+    asarray,
+    bool_,
+    concatenate,
+    cumsum,
+    dtype,
+    float32,
+    float64,
+    int64,
+    minimum,
+    ndarray,
+    ones,
+    split,
+    where,
+    zeros,
+)
+from numpy.random import rand, randint
+from random import random, seed as set_seed
 from enum import Enum
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
 import gymnasium as gym
 
 # os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
@@ -161,6 +184,405 @@ class DeepQNet:
     """
 
 
+class ReplayBuffer:
+    def __init__(self, max_size=1e6, obs_shape=(8,), obs_dtype=float32):
+        """
+        Experience replay buffer backed by preallocated arrays used as a ring, once full
+        every new transition overwrites the oldest one
+
+        Parameters:
+            max_size (1e6): Maximum number of transitions stored.
+            obs_shape ((8,)): The shape of an observation.
+            obs_dtype (float32): The dtype of an observation.
+        """
+        self.max_size = int(max_size)
+        self.observations = zeros((self.max_size, *obs_shape), dtype=obs_dtype)
+        self.actions = zeros(self.max_size, dtype=int64)
+        self.rewards = zeros(self.max_size, dtype=float32)
+        self.next_observations = zeros((self.max_size, *obs_shape), dtype=obs_dtype)
+        self.dones = zeros(self.max_size, dtype=bool_)
+        self.size = 0
+        self.idx = 0
+
+    def push(self, obs, action, reward, next_obs, done):
+        """
+        Stores a transition in O(1), overwriting the oldest one if the buffer is full.
+
+        Parameters:
+            obs: The observation the action was taken from.
+            action: The action taken.
+            reward: The reward stored with the transition.
+            next_obs: The observation that followed.
+            done: If the episode ended in this transition.
+        """
+        idx = self.idx
+        self.observations[idx] = obs
+        self.actions[idx] = action
+        self.rewards[idx] = reward
+        self.next_observations[idx] = next_obs
+        self.dones[idx] = done
+        self.idx = (idx + 1) % self.max_size
+        self.size = min(self.size + 1, self.max_size)
+
+    def extend(self, observations, actions, rewards, next_observations, dones):
+        """
+        Stores a batch of transitions, overwriting the oldest ones if the buffer is full.
+
+        Parameters:
+            observations: Array of observations the actions were taken from.
+            actions: Array of actions taken.
+            rewards: Array of rewards stored with the transitions.
+            next_observations: Array of observations that followed.
+            dones: Array of flags, True if the episode ended in the transition.
+
+        Returns:
+            Array with the buffer indices the transitions were written to.
+        """
+        idx = (self.idx + arange(len(actions))) % self.max_size
+        self.observations[idx] = observations
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_observations[idx] = next_observations
+        self.dones[idx] = dones
+        self.idx = (self.idx + len(actions)) % self.max_size
+        self.size = min(self.size + len(actions), self.max_size)
+        return idx
+
+    def sample(self, batch_size):
+        """
+        Samples transitions uniformly (with replacement).
+
+        Parameters:
+            batch_size: Number of transitions to sample.
+
+        Returns:
+            Tuple of arrays (observations, actions, rewards, next_observations, dones).
+        """
+        idx = randint(0, self.size, batch_size)
+        return (
+            self.observations[idx],
+            self.actions[idx],
+            self.rewards[idx],
+            self.next_observations[idx],
+            self.dones[idx],
+        )
+
+    nbytes = property(
+        lambda self: self.observations.nbytes
+        + self.actions.nbytes
+        + self.rewards.nbytes
+        + self.next_observations.nbytes
+        + self.dones.nbytes
+    )
+
+    nbytes.__doc__ = """
+        Memory allocated by the buffer in bytes, fixed at creation.
+    """
+
+    __len__ = lambda self: self.size
+
+
+class SumTree:
+    def __init__(self, capacity):
+        """
+        Binary tree stored in an array where every node holds the sum of its children,
+        leaves hold the priorities. Capacity is rounded up to a power of 2
+
+        Parameters:
+            capacity: Minimum number of leaves.
+        """
+        self.depth = (int(capacity) - 1).bit_length()
+        self.capacity = 1 << self.depth
+        self.tree = zeros(2 * self.capacity, dtype=float64)
+
+    total = property(lambda self: self.tree[1])
+
+    total.__doc__ = """
+        Sum of every priority in the tree.
+    """
+
+    def update(self, idx, priorities):
+        """
+        Sets leaf priorities and recomputes their ancestors, O(log n) per leaf.
+
+        Parameters:
+            idx: Leaf index or array of leaf indices.
+            priorities: New priority of each leaf.
+        """
+        tree = self.tree
+        idx = (idx if isinstance(idx, int) else asarray(idx)) + self.capacity
+        tree[idx] = priorities
+        for _ in range(self.depth):
+            idx //= 2
+            tree[idx] = tree[2 * idx] + tree[2 * idx + 1]
+
+    def find(self, values):
+        """
+        Finds the leaves whose cumulative priority range contains each value, O(log n) per value.
+
+        Parameters:
+            values: Array of values in [0, total).
+
+        Returns:
+            Array of leaf indices.
+        """
+        idx = ones(len(values), dtype=int64)
+        for _ in range(self.depth):
+            idx *= 2
+            left = self.tree[idx]
+            right = values >= left
+            values = values - left * right
+            idx += right
+        return idx - self.capacity
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    def __init__(
+        self,
+        max_size=1e6,
+        obs_shape=(8,),
+        obs_dtype=float32,
+        alpha=0.6,
+        beta=0.4,
+        epsilon=1e-6,
+    ):
+        """
+        Replay buffer sampling transitions proportionally to their TD error, with priorities
+        stored in a SumTree. New transitions get the highest priority seen so far
+
+        Parameters:
+            max_size (1e6): Maximum number of transitions stored.
+            obs_shape ((8,)): The shape of an observation.
+            obs_dtype (float32): The dtype of an observation.
+            alpha (0.6): How much prioritization is used (0 is uniform sampling).
+            beta (0.4): Importance-sampling correction exponent (1 fully compensates the bias).
+            epsilon (1e-6): Added to TD errors so no transition has zero priority.
+        """
+        super().__init__(max_size, obs_shape, obs_dtype)
+        self.tree = SumTree(self.max_size)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+
+    def push(self, obs, action, reward, next_obs, done):
+        """
+        Stores a transition with the highest priority seen so far.
+
+        Parameters:
+            obs: The observation the action was taken from.
+            action: The action taken.
+            reward: The reward stored with the transition.
+            next_obs: The observation that followed.
+            done: If the episode ended in this transition.
+        """
+        self.tree.update(self.idx, self.max_priority**self.alpha)
+        super().push(obs, action, reward, next_obs, done)
+
+    def extend(self, observations, actions, rewards, next_observations, dones):
+        """
+        Stores a batch of transitions with the highest priority seen so far.
+
+        Parameters:
+            observations: Array of observations the actions were taken from.
+            actions: Array of actions taken.
+            rewards: Array of rewards stored with the transitions.
+            next_observations: Array of observations that followed.
+            dones: Array of flags, True if the episode ended in the transition.
+
+        Returns:
+            Array with the buffer indices the transitions were written to.
+        """
+        idx = super().extend(observations, actions, rewards, next_observations, dones)
+        self.tree.update(idx, self.max_priority**self.alpha)
+        return idx
+
+    def sample(self, batch_size):
+        """
+        Samples transitions proportionally to their priority, one in each of batch_size
+        equal slices of the total priority.
+
+        Parameters:
+            batch_size: Number of transitions to sample.
+
+        Returns:
+            Tuple of arrays (observations, actions, rewards, next_observations, dones,
+            indices, importance-sampling weights normalized by the batch maximum).
+        """
+        total = self.tree.total
+        values = (arange(batch_size) + rand(batch_size)) * (total / batch_size)
+        idx = minimum(self.tree.find(values), self.size - 1)
+        weights = (self.size * self.tree.tree[idx + self.tree.capacity] / total) ** (
+            -self.beta
+        )
+        return (
+            self.observations[idx],
+            self.actions[idx],
+            self.rewards[idx],
+            self.next_observations[idx],
+            self.dones[idx],
+            idx,
+            (weights / weights.max()).astype(float32),
+        )
+
+    def update_priorities(self, idx, td_errors):
+        """
+        Updates the priorities of sampled transitions from their new TD errors.
+
+        Parameters:
+            idx: Indices returned by sample.
+            td_errors: TD error of each transition.
+        """
+        priorities = nabs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(idx, priorities**self.alpha)
+
+
+def greedy_probability(epsilon_0, step, n_steps):
+    """
+    Parameters:
+        epsilon_0: Initial probability.
+        step: The current step for the whole execution.
+        n_steps: The total number of steps in the whole execution.
+
+    Returns:
+        Probability of choosing the action from the Q-values, decaying linearly from epsilon_0.
+    """
+    return max(-(1.25 * epsilon_0 / n_steps) * step + epsilon_0, 0)
+
+
+transition_dtype = lambda obs_shape, obs_dtype: dtype(
+    [
+        ("observation", obs_dtype, obs_shape),
+        ("action", int64),
+        ("reward", float32),
+        ("next_observation", obs_dtype, obs_shape),
+        ("done", bool_),
+    ]
+)
+
+transition_dtype.__doc__ = """
+    Parameters:
+        obs_shape: The shape of an observation.
+        obs_dtype: The dtype of an observation.
+
+    Returns:
+        Structured dtype of one transition, used for the chunks shared by actors and learner.
+"""
+
+
+def flatten_weights(net):
+    """
+    Parameters:
+        net: A DeepQNet.
+
+    Returns:
+        A float32 array with every weight of the network.
+    """
+    return concatenate([i.ravel() for i in net.net.get_weights()]).astype(float32)
+
+
+def unflatten_weights(flat, shapes):
+    """
+    Parameters:
+        flat: Array returned by flatten_weights.
+        shapes: Shapes of the network weights.
+
+    Returns:
+        List of weight arrays, ready for set_weights.
+    """
+    sizes = [int(array(shape).prod()) for shape in shapes]
+    return [
+        i.reshape(shape) for i, shape in zip(split(flat, cumsum(sizes)[:-1]), shapes)
+    ]
+
+
+def run_actor(
+    actor_id,
+    model_json,
+    shapes,
+    weights_name,
+    version,
+    chunks_name,
+    chunks_shape,
+    chunks_dtype,
+    free_chunks,
+    full_chunks,
+    stop,
+    epsilon_0,
+    n_steps,
+    seed,
+):
+    """
+    Actor process, fills shared-memory chunks with LunarLander-v3 transitions until stop is set
+
+    Parameters:
+        actor_id: Index of the actor.
+        model_json: Architecture of the DeepQNet (keras json).
+        shapes: Shapes of the network weights.
+        weights_name: Name of the shared memory holding the flattened learner weights.
+        version: Shared value with the learner step of the last published weights, its lock guards the weights.
+        chunks_name: Name of the shared memory holding the transition chunks.
+        chunks_shape: Tuple (number of chunks, transitions per chunk).
+        chunks_dtype: Dtype of a transition.
+        free_chunks: Queue of chunk indices the actor can fill.
+        full_chunks: Queue receiving tuples (chunk index, finished episodes) once a chunk is full.
+        stop: Event set by the learner when training ends.
+        epsilon_0: Initial probability of choosing the action from the Q-values.
+        n_steps: Number of learner steps, used by the epsilon schedule.
+        seed: Seed for the environment (actor k uses seed + k), None for random.
+    """
+    if seed is not None:
+        set_seed(seed + actor_id)
+    net = model_from_json(model_json)
+    weights_memory = SharedMemory(weights_name)
+    chunks_memory = SharedMemory(chunks_name)
+    weights = ndarray(
+        sum(int(array(shape).prod()) for shape in shapes),
+        dtype=float32,
+        buffer=weights_memory.buf,
+    )
+    chunks = ndarray(chunks_shape, dtype=chunks_dtype, buffer=chunks_memory.buf)
+    actor_env = gym.make("LunarLander-v3")
+    obs, _ = actor_env.reset(seed=None if seed is None else seed + actor_id)
+    actor_env.action_space.seed(None if seed is None else seed + actor_id)
+    seen, chunk = -1, None
+
+    try:
+        while not stop.is_set():
+            try:
+                idx = free_chunks.get(timeout=0.1)
+            except Empty:
+                continue
+
+            if version.value != seen:
+                with version.get_lock():
+                    seen = version.value
+                    net.set_weights(unflatten_weights(weights, shapes))
+            probability = greedy_probability(epsilon_0, seen, n_steps)
+
+            chunk, finished = chunks[idx], 0
+            for i in range(len(chunk)):
+                if random() < probability:
+                    action = int(argmax(net.predict_on_batch(obs.reshape(1, -1))))
+                else:
+                    action = actor_env.action_space.sample()
+                next_obs, reward, terminated, truncated, _ = actor_env.step(action)
+                chunk[i] = (obs, action, reward, next_obs, terminated or truncated)
+                if terminated or truncated:
+                    finished += 1
+                    obs, _ = actor_env.reset()
+                else:
+                    obs = next_obs
+            full_chunks.put((idx, finished))
+    finally:
+        full_chunks.cancel_join_thread()
+        actor_env.close()
+        del weights, chunks, chunk
+        weights_memory.close()
+        chunks_memory.close()
+
+
 def env_reset_if_terminated(state):
     """
     Resets the environment based on the status of termination or truncated from state
@@ -215,6 +637,9 @@ class Agent:
         alpha=0.5,
         on_episode_end=None,
         on_episode_end_args=None,
+        prioritized=False,
+        priority_alpha=0.6,
+        priority_beta=0.4,
     ):
         self.neural_net = neural_net
         self.max_buffer_size = max_buffer_size
@@ -229,6 +654,80 @@ class Agent:
         self.n_episodes = 0
         self.on_episode_end = on_episode_end
         self.on_episode_end_args = on_episode_end_args
+        self.prioritized = prioritized
+        self.priority_alpha = priority_alpha
+        self.priority_beta = priority_beta
+
+    def _make_buffer(self, observation_space):
+        """
+        Parameters:
+            observation_space: Observation space of a single environment.
+
+        Returns:
+            An empty PrioritizedReplayBuffer if the agent is prioritized, a ReplayBuffer otherwise.
+        """
+        if self.prioritized:
+            return PrioritizedReplayBuffer(
+                self.max_buffer_size,
+                observation_space.shape,
+                observation_space.dtype,
+                alpha=self.priority_alpha,
+                beta=self.priority_beta,
+            )
+        return ReplayBuffer(
+            self.max_buffer_size, observation_space.shape, observation_space.dtype
+        )
+
+    def _end_episode(self):
+        """
+        Counts a finished episode and runs the on_episode_end callback.
+        """
+        if self.on_episode_end:
+            (
+                self.on_episode_end(*self.on_episode_end_args)
+                if self.on_episode_end_args
+                else self.on_episode_end()
+            )
+        self.n_episodes += 1
+
+    def _train_model(self, buf, target_net):
+        """
+        Trains the model using a mini-batch sampled from the experience replay buffer.
+
+        Parameters:
+            buf: The experience replay buffer containing past experiences.
+            target_net: The DeepQNet used to estimate the value of next states.
+        """
+        if self.prioritized:
+            states, actions, rewards, next_states, dones, idx, weights = buf.sample(
+                self.batch_size
+            )
+        else:
+            states, actions, rewards, next_states, dones = buf.sample(self.batch_size)
+            weights = None
+
+        q_values = array(self.neural_net.net.predict_on_batch(states))
+        next_q_values = array(target_net.net.predict_on_batch(next_states))
+
+        self.rewards.extend(rewards)
+        targets = where(
+            dones, rewards, rewards + self.gamma * next_q_values.max(axis=1)
+        )
+        if self.prioritized:
+            buf.update_priorities(
+                idx, targets - q_values[arange(len(actions)), actions]
+            )
+        q_values[arange(len(actions)), actions] = targets
+
+        acc, loss = array(
+            list(
+                self.neural_net.net.fit(
+                    states, q_values, sample_weight=weights, epochs=1, verbose=0
+                ).history.values()
+            )
+        ).flatten()
+        self.accuracy.append(acc)
+        self.loss.append(loss)
 
     def run_n_steps(self, n_steps, seed=None, human=False):
         self.n_episodes = 0
@@ -258,9 +757,7 @@ class Agent:
                 Returns:
                     if the agent should choose a greedy action
                 """
-                if random() < max(
-                    -(1.25 * self.epsilon_0 / n_steps) * step + self.epsilon_0, 0
-                ):
+                if random() < greedy_probability(self.epsilon_0, step, n_steps):
                     return True
                 return False
 
@@ -274,103 +771,43 @@ class Agent:
                 global env
                 return env.action_space.sample()
 
-        def update_buffer(buf, uple_5, step):
+        def update_buffer(buf, previous, state):
             """
-            Updates the buffer with a new experience and ensures its size does not exceed the maximum buffer size.
+            Stores the previous experience in the buffer now that its next state is known.
 
             Parameters:
                 buf: The experience replay buffer.
-                uple_5: A list containing the current state, action, reward, next state, and done flag.
-                step: The current step in the execution.
-            """
-            buf.append(uple_5)
-
-            if len(buf) > self.max_buffer_size:
-                buf.pop(0)
-
-            if step > 0:
-                if len(buf) < 2:
-                    raise ValueError("Max buffer size must be greater than 1")
-
-                buf[-2][3] = state.observation
-
-        def train_model(buf, state):
-            """
-            Trains the model using a mini-batch sampled from the experience replay buffer.
-
-            Parameters:
-                buf: The experience replay buffer containing past experiences.
+                previous: A tuple containing the previous state, action, reward and done flag.
                 state: The current state of the environment.
             """
-            mini_batch = sample(buf, self.batch_size)
-            states = []
-            targets = []
-
-            for state, action, reward, next_state, done in mini_batch:
-                if next_state is None:
-                    continue
-
-                q_values = array(
-                    self.neural_net.net.predict(state.reshape(1, -1), verbose=0)
-                ).flatten()
-
-                self.rewards.append(reward)
-                target = reward
-
-                if not done:
-                    next_q_values = target_net.net.predict(
-                        next_state.reshape(1, -1), verbose=0
-                    )
-                    target = reward + self.gamma * max(next_q_values[0])
-
-                q_values[action] = target
-
-                states.append(state)
-                targets.append(q_values)
-
-            acc, loss = array(
-                list(
-                    self.neural_net.net.fit(
-                        array(states), array(targets), epochs=1, verbose=0
-                    ).history.values()
-                )
-            ).flatten()
-            self.accuracy.append(acc)
-            self.loss.append(loss)
+            if previous is not None:
+                obs, action, reward, done = previous
+                buf.push(obs, action, reward, state.observation, done)
 
         env = get_env(seed=seed, human=human)
         target_net = DeepQNet(model=self.neural_net)
 
-        buffer = []
+        buffer = self._make_buffer(env.observation_space)
+        previous = None
 
         action = env.action_space.sample()
 
         for i in range(n_steps):
             state = State(*env.step(action))
             action = epsilon_greedy(i, n_steps, state)
-            update_buffer(
-                buffer,
-                [
-                    state.observation,
-                    action,
-                    state.reward,
-                    None,
-                    state.terminated or state.truncated,
-                ],
-                i,
+            update_buffer(buffer, previous, state)
+            previous = (
+                state.observation,
+                action,
+                state.reward,
+                state.terminated or state.truncated,
             )
 
             if env_reset_if_terminated(state):
-                if self.on_episode_end:
-                    (
-                        self.on_episode_end(*self.on_episode_end_args)
-                        if self.on_episode_end_args
-                        else self.on_episode_end()
-                    )
-                self.n_episodes += 1
+                self._end_episode()
 
             if len(buffer) >= self.batch_size:
-                train_model(buffer, state)
+                self._train_model(buffer, target_net)
 
             if i % self.update_target == 0:
                 target_net.copy_weights(self.neural_net)
@@ -378,6 +815,186 @@ class Agent:
             print(f"Step {i}")
         return self.n_episodes
 
+    def run_vector_steps(self, n_steps, n_envs=4, asynchronous=True, seed=None):
+        """
+        Trains the agent on n_envs LunarLander-v3 environments stepped at once, the actions of
+        every environment are chosen with a single forward pass and every transition is
+        stored in the replay buffer.
+
+        Parameters:
+            n_steps: Number of vector steps (each one steps every environment).
+            n_envs (4): Number of LunarLander-v3 copies.
+            asynchronous (True): Steps environments in subprocesses (AsyncVectorEnv) instead of sequentially.
+            seed (None): Seed for the first reset (environment k uses seed + k).
+
+        Returns:
+            The number of finished episodes.
+        """
+        self.n_episodes = 0
+        envs = (
+            gym.vector.AsyncVectorEnv if asynchronous else gym.vector.SyncVectorEnv
+        )([lambda: gym.make("LunarLander-v3")] * n_envs)
+        target_net = DeepQNet(model=self.neural_net)
+        buffer = self._make_buffer(envs.single_observation_space)
+
+        observations, _ = envs.reset(seed=seed)
+        # Vector environments reset on the step after an episode ends, that step is not a transition
+        resetting = zeros(n_envs, dtype=bool_)
+        for i in range(n_steps):
+            actions = envs.action_space.sample()
+            greedy = rand(n_envs) < greedy_probability(self.epsilon_0, i, n_steps)
+            if greedy.any():
+                q_values = self.neural_net.net.predict_on_batch(observations)
+                actions = where(greedy, argmax(q_values, axis=1), actions)
+
+            next_observations, rewards, terminated, truncated, _ = envs.step(actions)
+            dones = terminated | truncated
+            for k in range(n_envs):
+                if resetting[k]:
+                    continue
+                buffer.push(
+                    observations[k],
+                    actions[k],
+                    rewards[k],
+                    next_observations[k],
+                    dones[k],
+                )
+                if dones[k]:
+                    self._end_episode()
+            observations, resetting = next_observations, dones
+
+            if len(buffer) >= self.batch_size:
+                self._train_model(buffer, target_net)
+
+            if i % self.update_target == 0:
+                target_net.copy_weights(self.neural_net)
+
+        envs.close()
+        return self.n_episodes
+
+    def run_actor_learner(
+        self, n_steps, n_actors=2, chunk_size=64, n_chunks=None, seed=None
+    ):
+        """
+        Trains the agent while actor processes collect experience in parallel. Actors step their
+        own LunarLander-v3 environment with a copy of the network and write transitions to
+        shared-memory chunks, the learner moves full chunks into the replay buffer and trains
+        continuously. The learner weights are broadcast to the actors every update_target steps.
+
+        Parameters:
+            n_steps: Number of learner training steps.
+            n_actors (2): Number of actor processes.
+            chunk_size (64): Number of transitions an actor writes before handing a chunk over.
+            n_chunks (None): Number of shared chunks (4 per actor if None), bounds how far actors run ahead.
+            seed (None): Seed for the actors (actor k uses seed + k).
+
+        Returns:
+            The number of finished episodes.
+        """
+        self.n_episodes = 0
+        n_chunks = 4 * n_actors if n_chunks is None else n_chunks
+        spec_env = gym.make("LunarLander-v3")
+        observation_space = spec_env.observation_space
+        spec_env.close()
+        chunks_dtype = transition_dtype(
+            observation_space.shape, observation_space.dtype
+        )
+
+        target_net = DeepQNet(model=self.neural_net)
+        target_net.copy_weights(self.neural_net)
+        buffer = self._make_buffer(observation_space)
+        flat = flatten_weights(self.neural_net)
+        shapes = [i.shape for i in self.neural_net.net.get_weights()]
+
+        ctx = get_context("spawn")
+        weights_memory = SharedMemory(create=True, size=flat.nbytes)
+        chunks_memory = SharedMemory(
+            create=True, size=n_chunks * chunk_size * chunks_dtype.itemsize
+        )
+        weights = ndarray(flat.shape, dtype=float32, buffer=weights_memory.buf)
+        chunks = ndarray(
+            (n_chunks, chunk_size), dtype=chunks_dtype, buffer=chunks_memory.buf
+        )
+        weights[:] = flat
+        version = ctx.Value("q", 0)
+        free_chunks, full_chunks, stop = ctx.Queue(), ctx.Queue(), ctx.Event()
+        for idx in range(n_chunks):
+            free_chunks.put(idx)
+
+        actors = [
+            ctx.Process(
+                target=run_actor,
+                args=(
+                    k,
+                    self.neural_net.net.to_json(),
+                    shapes,
+                    weights_memory.name,
+                    version,
+                    chunks_memory.name,
+                    (n_chunks, chunk_size),
+                    chunks_dtype,
+                    free_chunks,
+                    full_chunks,
+                    stop,
+                    self.epsilon_0,
+                    n_steps,
+                    seed,
+                ),
+                daemon=True,
+            )
+            for k in range(n_actors)
+        ]
+        for actor in actors:
+            actor.start()
+
+        chunk = None
+        try:
+            step = 0
+            while step < n_steps:
+                while True:
+                    try:
+                        idx, finished = full_chunks.get(
+                            block=len(buffer) < self.batch_size, timeout=1
+                        )
+                    except Empty:
+                        if len(buffer) >= self.batch_size:
+                            break
+                        if not any(actor.is_alive() for actor in actors):
+                            raise RuntimeError(
+                                "Every actor exited before filling the buffer"
+                            )
+                        continue
+                    chunk = chunks[idx]
+                    buffer.extend(
+                        chunk["observation"],
+                        chunk["action"],
+                        chunk["reward"],
+                        chunk["next_observation"],
+                        chunk["done"],
+                    )
+                    free_chunks.put(idx)
+                    for _ in range(finished):
+                        self._end_episode()
+
+                self._train_model(buffer, target_net)
+                step += 1
+
+                if step % self.update_target == 0:
+                    target_net.copy_weights(self.neural_net)
+                    with version.get_lock():
+                        weights[:] = flatten_weights(self.neural_net)
+                        version.value = step
+        finally:
+            stop.set()
+            for actor in actors:
+                actor.join()
+            del weights, chunks, chunk
+            weights_memory.close()
+            weights_memory.unlink()
+            chunks_memory.close()
+            chunks_memory.unlink()
+        return self.n_episodes
+
 
 # def main():
 #     get_env(human=True)